@@ -1,11 +1,11 @@
-import asyncio, yaml # , logging
-import ganyuan, other_thing, gongzhao_model, stage_enemy, search_model
+import asyncio, argparse, logging, sys
+# 各功能模块及httpx、bs4、yaml等依赖较重，在首次使用对应功能时才导入，加快启动
 
-# 配置日志
-# logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-# logger = logging.getLogger(__name__)
+# 命令行指定--offline时为True，覆盖config.yaml中mirror.offline的设置
+OFFLINE_MODE = False
 
 def load_yaml_config(config_path):
+    import yaml
     with open(config_path, 'r', encoding='utf-8') as file:
         config = yaml.safe_load(file)
     print("已加载配置文件")
@@ -17,7 +17,6 @@ async def main():
     程序的主异步函数
     """
     # logger.info("程序启动") # 用于测试加载速度。使用asyncio更耗时
-    config = load_yaml_config('config.yaml')
     print("PRTS信息查询系统")
     print("-" * 30)
     print(f"功能列表："
@@ -26,32 +25,149 @@ async def main():
           f"\n2 获取其他信息(如：娜仁图亚的信物)"
           f"\n3 公招查询"
           f"\n4 关卡及敌人查询"
+          f"\n5 敌人条件查询(如：地位=领袖 防御力>1000 排序=-法术抗性)"
           f"\n图片一般为6MB左右，下载可能有点慢")
     print("-" * 30)
 
     try:
         lei_xing = int(input("查找类型："))
+        if lei_xing not in (1, 2, 3, 4, 5):
+            print("输入的功能选项无效。")
+            return
+        config = load_config()
         if lei_xing == 1:
+            import ganyuan
             ganyuan1 = ganyuan.initialize_ganyuan(config)
             await ganyuan1.run()
+            # 等待后台的干员索引更新完成后再关闭客户端
+            await ganyuan.operator_index.wait_for_refresh()
         elif lei_xing == 2:
+            import other_thing
             other_thing1 = other_thing.initialize_other_thing(config)
             await other_thing1.run()
         elif lei_xing == 3:
+            import gongzhao_model
             gongzhao_model1 = gongzhao_model.initialize_gongzhao_model(config)
             await gongzhao_model1.run()
+            await gongzhao_model1.wait_for_refresh()
         elif lei_xing == 4:
+            import stage_enemy
             stage_enemy1 = stage_enemy.initialize_stage_enemy(config)
             await stage_enemy1.run()
-        else:
-            print("输入的功能选项无效。")
+            # 查询已输出，等待后台的数据刷新完成后再关闭客户端
+            await stage_enemy1.wait_for_refresh()
+        elif lei_xing == 5:
+            import enemy_query
+            enemy_query1 = enemy_query.initialize_enemy_query(config)
+            await enemy_query1.run()
+            await enemy_query1.stage_enemy.wait_for_refresh()
     except ValueError:
         print("请输入有效数字作为查找类型。")
     finally:
         # 确保关闭HTTP客户端
-        await search_model.search_model.close_http_client()
+        await close_http_client()
+
+
+def load_config():
+    """加载配置文件，并据此设置API请求参数"""
+    from search_model import search_model
+    config = load_yaml_config('config.yaml')
+    if OFFLINE_MODE:
+        config.setdefault("mirror", {})["offline"] = True
+    search_model.configure(config)
+    return config
+
+
+async def close_http_client():
+    """关闭HTTP客户端；没有使用过任何功能时search_model尚未导入，无需关闭"""
+    search_model_module = sys.modules.get("search_model")
+    if search_model_module is not None:
+        await search_model_module.search_model.close_http_client()
+
+
+async def serve(args):
+    """以常驻服务模式运行，供bot等程序调用"""
+    import service
+    config = load_config()
+    service_config = config.get("service", {})
+    host = args.host or service_config.get("host", "127.0.0.1")
+    port = args.port or service_config.get("port", 8765)
+    await service.QueryService(config).serve(host, port)
+
+
+async def run_batch(args):
+    """批量查询模式，结果以JSON Lines输出"""
+    import batch
+    config = load_config()
+    concurrency = args.concurrency or config.get("batch", {}).get("concurrency", 8)
+    requests = batch.read_batch_requests(args.batch)
+    try:
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                await batch.run_batch(config, requests, concurrency, f)
+        else:
+            await batch.run_batch(config, requests, concurrency)
+    finally:
+        await close_http_client()
+
+
+async def run_sync(full=False):
+    """同步本地镜像，之后可用--offline（或config.yaml中mirror.offline）离线查询"""
+    import time, httpx, wiki_mirror
+    config = load_config()
+    mirror = wiki_mirror.initialize_wiki_mirror(config)
+    last_sync = mirror.last_sync_time()
+    last_sync_text = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last_sync)) if last_sync else "从未同步"
+    try:
+        result = await mirror.sync(full=full)
+        print(f"镜像同步完成：共 {result.get('pages', 0)} 个页面，下载 {result.get('downloaded', 0)} 个，"
+              f"删除 {result.get('removed', 0)} 个（上次同步：{last_sync_text}）")
+    except (httpx.HTTPStatusError, httpx.RequestError) as e:
+        print(f"镜像同步失败，请检查网络连接或API状态。错误: {e}")
+        print(f"镜像中的数据仍为上次同步时的数据（{last_sync_text}）")
+    finally:
+        await close_http_client()
+
+
+def write_stats(path):
+    """将各阶段耗时统计写入文件，.prom/.txt为Prometheus文本格式，其余为json"""
+    from stats import stats
+    content = stats.dump_prometheus() if path.endswith(('.prom', '.txt')) else stats.dump_json()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="PRTS信息查询系统")
+    parser.add_argument("--serve", action="store_true", help="以常驻服务模式运行（JSON Lines over TCP）")
+    parser.add_argument("--host", help="服务监听地址，默认读取config.yaml")
+    parser.add_argument("--port", type=int, help="服务监听端口，默认读取config.yaml")
+    parser.add_argument("--batch", metavar="FILE", help="批量查询，从文件读取查询（- 表示标准输入）")
+    parser.add_argument("--concurrency", type=int, help="批量查询的最大并发数，默认读取config.yaml")
+    parser.add_argument("--output", help="批量查询结果输出文件，默认输出到标准输出")
+    parser.add_argument("--sync", action="store_true", help="同步本地镜像（设置见config.yaml的mirror项）")
+    parser.add_argument("--full", action="store_true", help="与--sync一起使用，完整同步而不是只同步有变化的页面")
+    parser.add_argument("--offline", action="store_true", help="离线模式，只从本地镜像读取")
+    parser.add_argument("--stats", metavar="FILE", help="退出时写入各阶段耗时统计（.prom为Prometheus格式，否则为json）")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
+    # 配置日志（各模块只获取logger，日志格式在入口统一设置）
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    OFFLINE_MODE = args.offline
     # 使用 asyncio.run() 来运行主异步函数
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        if args.serve:
+            asyncio.run(serve(args))
+        elif args.batch:
+            asyncio.run(run_batch(args))
+        elif args.sync:
+            asyncio.run(run_sync(args.full))
+        else:
+            asyncio.run(main())
+    finally:
+        # 服务模式通常以Ctrl+C结束，同样写入统计
+        if args.stats:
+            write_stats(args.stats)
\ No newline at end of file
@@ -0,0 +1,69 @@
+import asyncio, json, sys, contextlib, logging
+from service import QueryService, QUERY_TYPES
+
+logger = logging.getLogger(__name__)
+
+"""
+批量查询模式：从文件或标准输入读取查询，限制并发数执行，每完成一个输出一行json
+输入每行一个查询，可以是json：{"id": 1, "type": "ganyuan", "query": "娜仁图亚"}
+也可以是“类型 查询内容”：ganyuan 娜仁图亚 / 4 SS-8
+"""
+
+
+def parse_batch_line(line: str, line_number: int):
+    """解析一行输入，返回请求字典；空行和#开头的注释行返回None"""
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if line.startswith("{"):
+        request = json.loads(line)
+        request.setdefault("id", line_number)
+        return request
+    # 类型未知时由服务返回错误
+    query_type, _, query = line.partition(" ")
+    return {"id": line_number, "type": query_type, "query": query.strip()}
+
+
+def read_batch_requests(source):
+    """从文件路径或标准输入（"-"）读取全部请求"""
+    if source == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    requests = []
+    for line_number, line in enumerate(lines, start=1):
+        try:
+            request = parse_batch_line(line, line_number)
+        except json.JSONDecodeError as e:
+            logger.error(f"第{line_number}行不是有效的json: {e}")
+            continue
+        if request is not None:
+            requests.append(request)
+    return requests
+
+
+async def run_batch(config, requests, concurrency=8, output=None):
+    """并发执行全部请求（最多concurrency个同时进行），按完成顺序逐行输出json"""
+    output = output or sys.stdout
+    query_service = QueryService(config)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(request):
+        async with semaphore:
+            return await query_service.handle_request(request)
+
+    # 各模块的提示信息改为输出到stderr，保证stdout只有json结果
+    with contextlib.redirect_stdout(sys.stderr):
+        # 只预加载本批查询用到的数据集
+        await query_service.warm_up({QUERY_TYPES.get(str(request.get("type"))) for request in requests})
+        tasks = [asyncio.create_task(run_one(request)) for request in requests]
+        failed = 0
+        for task in asyncio.as_completed(tasks):
+            response = await task
+            if not response["ok"]:
+                failed += 1
+            output.write(json.dumps(response, ensure_ascii=False) + "\n")
+            output.flush()
+    logger.info(f"批量查询完成，共 {len(requests)} 个，失败 {failed} 个")
+    return failed
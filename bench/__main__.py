@@ -0,0 +1,223 @@
+import asyncio, argparse, json, logging, os, statistics, tempfile, time
+import yaml
+import ganyuan, other_thing, gongzhao_model, stage_enemy, enemy_query
+from search_model import search_model
+from operator_index import operator_index
+from name_index import NameIndex
+from wiki_cache import WikitextCache
+import wikitext_parser
+from enemy_store import EnemyStore
+from stats import stats
+from bench.fixtures import LatencyModel, RecordingTransport, replay_transport, load_fixtures, save_fixtures
+from bench.synthetic import SyntheticPRTS
+
+"""
+离线基准测试：回放录制的PRTS API响应，测量各查询的端到端耗时和各阶段耗时
+    python -m bench                       # 回放bench/fixtures/prts.json，不存在时使用离线生成的数据
+    python -m bench --latency 80 --jitter 20 --rounds 10
+    python -m bench --record              # 从PRTS录制fixtures（需要联网）
+冷启动轮次每轮清空全部缓存和本地数据，热轮次复用缓存，与常驻服务的情形一致
+"""
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FIXTURES = os.path.join(ROOT_DIR, 'bench', 'fixtures', 'prts.json')
+
+logger = logging.getLogger(__name__)
+
+
+def load_config():
+    with open(os.path.join(ROOT_DIR, 'config.yaml'), 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+
+def scenarios(config):
+    """基准测试的查询：干员、道具、公招标签、大型关卡、需渲染页面的关卡、「敌人一览/数据」和敌人条件查询"""
+    ganyuan_model = ganyuan.initialize_ganyuan(config)
+    other_thing_model = other_thing.initialize_other_thing(config)
+    gongzhao = gongzhao_model.initialize_gongzhao_model(config)
+    stage_enemy_model = stage_enemy.initialize_stage_enemy(config)
+    enemy_query_model = enemy_query.initialize_enemy_query(config)
+    return [
+        ("ganyuan 娜仁图亚", lambda: ganyuan_model.clean_over_wiki("娜仁图亚", "2")),
+        ("other 娜仁图亚的信物", lambda: other_thing_model.clean_over_wiki("娜仁图亚的信物")),
+        ("gongzhao 5标签", lambda: gongzhao.query(["高级资深干员", "狙击干员", "输出", "远程位", "支援"])),
+        ("stage SS-8", lambda: stage_enemy_model.get_enemy_in_stage("SS-8")),
+        ("stage 1-7", lambda: stage_enemy_model.get_enemy_in_stage("1-7")),
+        ("enemy_data 敌人一览/数据", lambda: stage_enemy_model.update_enemy_data(force_update=True)),
+        ("enemy_query 领袖 防御力>500", lambda: enemy_query_model.query("地位=领袖 防御力>500 排序=-生命值 前10 统计=攻击力")),
+    ]
+
+
+def reset_state(config, data_dir):
+    """清空内存缓存，并把本地数据文件指向新的空目录，模拟冷启动"""
+    os.makedirs(data_dir, exist_ok=True)
+    search_model.wikitext_cache = WikitextCache(os.path.join(data_dir, 'wikitext_cache'))
+    search_model.image_url_cache.clear()
+    wikitext_parser.clear_cache()
+
+    operator_index.titles = {}
+    operator_index.index = NameIndex()
+    operator_index.last_update_time = 0
+    operator_index._loaded = False
+    operator_index._refresh_task = None
+    operator_index._refresh_failures = 0
+    operator_index._next_refresh_time = 0
+    operator_index.INDEX_FILE = os.path.join(data_dir, 'operator_index.json')
+
+    gongzhao = gongzhao_model.initialize_gongzhao_model(config)
+    gongzhao.recruitment_data = []
+    gongzhao.last_update_time = 0
+    gongzhao.tag_index = None
+    gongzhao._refresh_task = None
+    gongzhao._refresh_failures = 0
+    gongzhao._next_refresh_time = 0
+    gongzhao.RECRUITMENT_DATA_FILE = os.path.join(data_dir, 'recruitment_data.json')
+
+    stage_enemy_model = stage_enemy.initialize_stage_enemy(config)
+    stage_enemy_model.set_enemy_data([])
+    stage_enemy_model.last_update_time = 0
+    stage_enemy_model.enemy_data_revid = None
+    stage_enemy_model._refresh_task = None
+    stage_enemy_model._refresh_failures = 0
+    stage_enemy_model._next_refresh_time = 0
+    stage_enemy_model.stage_cache.clear()
+    stage_enemy_model.enemy_store.close()
+    stage_enemy_model.ENEMY_DATA_FILE = os.path.join(data_dir, 'enemy_data.json')
+    stage_enemy_model.enemy_store = EnemyStore(os.path.join(data_dir, 'enemy_data.db'))
+
+    enemy_query_model = enemy_query.initialize_enemy_query(config)
+    enemy_query_model.table = None
+    enemy_query_model.table_version = None
+
+
+async def run_round(config):
+    """依次执行各查询，返回 查询名→耗时（秒）"""
+    timings = {}
+    for name, make_query in scenarios(config):
+        start = time.perf_counter()
+        await make_query()
+        timings[name] = time.perf_counter() - start
+    await stage_enemy.initialize_stage_enemy(config).wait_for_refresh()
+    await operator_index.wait_for_refresh()
+    await gongzhao_model.initialize_gongzhao_model(config).wait_for_refresh()
+    return timings
+
+
+async def record(config, path, synthetic=False):
+    """执行一遍全部查询，录制API响应"""
+    fixtures = {}
+    upstream = SyntheticPRTS().transport() if synthetic else None
+    search_model.set_transport(RecordingTransport(fixtures, upstream))
+    with tempfile.TemporaryDirectory() as data_dir:
+        reset_state(config, data_dir)
+        await run_round(config)
+    await search_model.close_http_client()
+    if path:
+        save_fixtures(fixtures, path)
+        logger.warning(f"已录制 {len(fixtures)} 个响应: {path}")
+    return fixtures
+
+
+async def benchmark(config, fixtures, args):
+    """冷启动和热缓存各执行若干轮，返回 (各轮耗时, 冷/热两类的阶段统计)"""
+    missing = set()
+    latency = LatencyModel(args.latency, args.jitter, args.seed)
+    search_model.set_transport(replay_transport(fixtures, latency, missing))
+    cold, warm = [], []
+    phases = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        stats.reset()
+        for i in range(args.cold_rounds):
+            reset_state(config, os.path.join(data_dir, f"cold{i}"))
+            cold.append(await run_round(config))
+        phases["cold"] = stats.to_dict()
+        stats.reset()
+        for _ in range(args.rounds):
+            warm.append(await run_round(config))
+        phases["warm"] = stats.to_dict()
+        stage_enemy.initialize_stage_enemy(config).enemy_store.close()
+    await search_model.close_http_client()
+    if missing:
+        logger.warning(f"{len(missing)} 个请求没有对应的fixtures，请重新录制：")
+        for key in sorted(missing):
+            logger.warning(f"  {key}")
+    return {"cold": cold, "warm": warm}, phases
+
+
+def summarize(rounds):
+    """每个查询的最小值、中位数、最大值（毫秒）"""
+    summary = {}
+    for kind, timings_list in rounds.items():
+        if not timings_list:
+            continue
+        for name in timings_list[0]:
+            values = [timings[name] * 1000 for timings in timings_list]
+            summary.setdefault(name, {})[kind] = {
+                "min_ms": round(min(values), 3),
+                "median_ms": round(statistics.median(values), 3),
+                "max_ms": round(max(values), 3),
+            }
+    return summary
+
+
+def print_report(summary, phases, args):
+    print(f"模拟网络延迟: {args.latency}±{args.jitter} ms，冷启动 {args.cold_rounds} 轮，热缓存 {args.rounds} 轮")
+    print(f"{'查询':<28}{'冷启动中位数':>12}{'冷启动最小':>12}{'热缓存中位数':>12}{'热缓存最小':>12}")
+    for name, kinds in summary.items():
+        cold = kinds.get("cold", {})
+        warm = kinds.get("warm", {})
+        print(f"{name:<28}{cold.get('median_ms', 0):>12.2f}{cold.get('min_ms', 0):>12.2f}"
+              f"{warm.get('median_ms', 0):>12.2f}{warm.get('min_ms', 0):>12.2f}")
+    for kind, data in phases.items():
+        print(f"\n各阶段耗时（{kind}）")
+        print(f"{'阶段':<40}{'次数':>8}{'平均ms':>10}{'最大ms':>10}{'字节数':>12}")
+        for phase, info in data["phases"].items():
+            print(f"{phase:<40}{info['count']:>8}{info['avg_ms']:>10.2f}{info['max_ms']:>10.2f}{info['bytes']:>12}")
+        for name, info in data["caches"].items():
+            print(f"缓存 {name}: 命中 {info['hits']}，未命中 {info['misses']}，命中率 {info['hit_ratio']:.2%}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="PRTS信息查询系统离线基准测试")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="录制的API响应文件")
+    parser.add_argument("--record", action="store_true", help="从PRTS录制fixtures后退出")
+    parser.add_argument("--synthetic", action="store_true", help="使用离线生成的数据（录制时作为上游，回放时忽略fixtures文件）")
+    parser.add_argument("--latency", type=float, default=50.0, help="模拟的每个请求的网络延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟的随机波动范围（毫秒）")
+    parser.add_argument("--seed", type=int, default=0, help="延迟波动的随机种子")
+    parser.add_argument("--cold-rounds", type=int, default=3, help="冷启动轮数")
+    parser.add_argument("--rounds", type=int, default=5, help="热缓存轮数")
+    parser.add_argument("--rate-limit", action="store_true", help="回放时保留config.yaml中的API限流设置")
+    parser.add_argument("--json", metavar="FILE", help="将结果写入json文件")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出各模块的日志")
+    return parser.parse_args()
+
+
+async def main(args):
+    config = load_config()
+    if not args.record and not args.rate_limit:
+        # 回放时不访问PRTS，限流只会让测量结果变成令牌桶的速率
+        config = {**config, "api": {**config.get("api", {}), "rate": 1e9, "burst": 1e9}}
+    search_model.configure(config)
+    if args.record:
+        await record(config, args.fixtures, args.synthetic)
+        return
+    if args.synthetic or not os.path.exists(args.fixtures):
+        logger.warning("使用离线生成的PRTS数据（可用 --record 录制真实的响应）")
+        fixtures = await record(config, None, synthetic=True)
+    else:
+        fixtures = load_fixtures(args.fixtures)
+    rounds, phases = await benchmark(config, fixtures, args)
+    summary = summarize(rounds)
+    print_report(summary, phases, args)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"summary": summary, "rounds": rounds, "phases": phases,
+                       "latency_ms": args.latency, "jitter_ms": args.jitter}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    asyncio.run(main(args))
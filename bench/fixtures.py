@@ -0,0 +1,88 @@
+import asyncio, json, os, random
+import httpx
+
+"""
+录制与回放API响应
+fixtures文件为json：请求键→{"status_code": 状态码, "json": 响应内容}
+请求键为排序后的查询参数（不含maxlag，其值不影响响应内容）
+"""
+
+IGNORED_PARAMS = ("maxlag",)
+
+
+def request_key(request: httpx.Request):
+    """由请求得到fixtures中的键，参数顺序不同的相同请求对应同一个键"""
+    params = sorted((name, value) for name, value in request.url.params.multi_items()
+                    if name not in IGNORED_PARAMS)
+    return f"{request.url.path}?" + "&".join(f"{name}={value}" for name, value in params)
+
+
+def load_fixtures(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_fixtures(fixtures: dict, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(fixtures, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+class LatencyModel:
+    """模拟网络延迟：每个请求等待 latency ± jitter 毫秒"""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, seed=0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.random = random.Random(seed)
+
+    async def wait(self):
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter) if self.jitter else self.latency
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def replay_transport(fixtures: dict, latency: LatencyModel = None, missing=None):
+    """
+    回放fixtures的MockTransport，未录制的请求返回404
+    missing为集合时，记录未命中的请求键，便于补录
+    """
+    latency = latency or LatencyModel()
+
+    async def handler(request: httpx.Request):
+        await latency.wait()
+        key = request_key(request)
+        fixture = fixtures.get(key)
+        if fixture is None:
+            if missing is not None:
+                missing.add(key)
+            return httpx.Response(404, json={"error": {"code": "fixture-missing", "info": key}})
+        return httpx.Response(fixture["status_code"], json=fixture["json"])
+
+    return httpx.MockTransport(handler)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """转发请求到真实的传输层，并把json响应记录到fixtures中"""
+
+    def __init__(self, fixtures: dict, transport: httpx.AsyncBaseTransport = None):
+        self.fixtures = fixtures
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request):
+        response = await self.transport.handle_async_request(request)
+        content = await response.aread()
+        try:
+            data = json.loads(content)
+        except ValueError:
+            data = None
+        # 只记录成功的json响应，重试前的错误响应不记录
+        if data is not None and response.status_code == 200 and "error" not in data:
+            self.fixtures[request_key(request)] = {"status_code": response.status_code, "json": data}
+        # 响应内容已解压，不再带上原有的Content-Encoding等头部
+        headers = {name: value for name, value in response.headers.items()
+                   if name.lower() in ("content-type", "retry-after")}
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    async def aclose(self):
+        await self.transport.aclose()
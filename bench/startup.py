@@ -0,0 +1,69 @@
+import argparse, json, os, statistics, subprocess, sys, time
+
+"""
+启动耗时基准测试：每次在新的解释器进程中加载程序入口，再导入某一功能所需的模块
+    python -m bench.startup --runs 20
+报告进程总耗时、入口加载耗时、功能模块导入耗时，以及已导入的重量级依赖
+"""
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 场景名→该功能首次使用时需要导入的模块（含读取config.yaml所需的yaml）
+CASES = {
+    "入口（显示菜单）": [],
+    "1 干员": ["yaml", "ganyuan"],
+    "2 道具": ["yaml", "other_thing"],
+    "3 公招": ["yaml", "gongzhao_model"],
+    "4 关卡及敌人": ["yaml", "stage_enemy"],
+    "5 敌人条件查询": ["yaml", "enemy_query"],
+    "服务模式": ["yaml", "service"],
+}
+HEAVY_MODULES = ("httpx", "bs4", "yaml", "sqlite3")
+
+CHILD_CODE = """
+import time
+start = time.perf_counter()
+import importlib, json, runpy, sys
+sys.path.insert(0, {root!r})
+runpy.run_path({entry!r}, run_name="startup_bench")
+entry = time.perf_counter()
+for name in {modules!r}:
+    importlib.import_module(name)
+feature = time.perf_counter()
+print(json.dumps({{"entry_ms": (entry - start) * 1000, "feature_ms": (feature - entry) * 1000,
+                  "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def run_case(modules):
+    code = CHILD_CODE.format(root=ROOT_DIR, entry=os.path.join(ROOT_DIR, '__main__.py'),
+                             modules=modules, heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准测试")
+    parser.add_argument("--runs", type=int, default=10, help="每个场景运行的次数")
+    parser.add_argument("--json", metavar="FILE", help="将结果写入json文件")
+    args = parser.parse_args()
+
+    report = {}
+    print(f"{'场景':<16}{'进程ms':>10}{'入口ms':>10}{'功能导入ms':>12}  已导入的依赖")
+    for case, modules in CASES.items():
+        results = [run_case(modules) for _ in range(args.runs)]
+        report[case] = {key: round(statistics.median(result[key] for result in results), 2)
+                        for key in ("process_ms", "entry_ms", "feature_ms")}
+        report[case]["loaded"] = results[-1]["loaded"]
+        print(f"{case:<16}{report[case]['process_ms']:>10.1f}{report[case]['entry_ms']:>10.1f}"
+              f"{report[case]['feature_ms']:>12.1f}  {', '.join(report[case]['loaded']) or '-'}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+import json, random, hashlib, time
+import httpx
+from name_index import normalize_name
+from search_model import SearchModel
+
+"""
+离线生成的PRTS数据：页面、cargo表和图片，按MediaWiki API的响应格式返回
+没有录制的fixtures时，基准测试先对其录制一遍，再与真实录制的fixtures一样回放
+数据规模参照PRTS：约300名干员、800种敌人、40个敌人的大型关卡
+"""
+
+PROFESSIONS = ["先锋", "近卫", "重装", "狙击", "术师", "医疗", "辅助", "特种"]
+POSITIONS = {"先锋": "近战", "近卫": "近战", "重装": "近战", "特种": "近战",
+             "狙击": "远程", "术师": "远程", "医疗": "远程", "辅助": "远程"}
+RECRUIT_TAGS = ["治疗", "支援", "输出", "群攻", "减速", "生存", "防护", "削弱", "位移", "控场",
+                "爆发", "召唤", "快速复活", "费用回复", "支援机械", "新手"]
+ENEMY_LEVELS = ["NORMAL", "ELITE", "BOSS"]
+ENEMY_LEVEL_NAMES = {"NORMAL": "普通", "ELITE": "精英", "BOSS": "领袖"}
+ENEMY_RACES = ["", "感染生物", "无人机", "萨卡兹", "宿主", "海嗣", "机械"]
+STAGE_ENEMY_ROWS = 40
+
+
+class SyntheticPRTS:
+    """
+    模拟PRTS的api.php，支持本项目用到的search、revisions、imageinfo、parse、cargoquery，
+    以及同步镜像用到的categorymembers/allpages生成器、allimages和recentchanges
+    """
+
+    def __init__(self, seed=0, operators=300, enemies=800):
+        self.random = random.Random(seed)
+        self.pages = {}  # 标题→wikitext
+        self.redirects = {}  # 重定向标题→目标标题
+        self.categories = {}  # 标题→分类
+        self.images = []  # 图片文件名
+        self.changes = []  # recentchanges记录，由edit/delete/move生成
+        self.chara = []  # cargo chara表
+        self.enemy_names = [f"敌人{i:03d}" for i in range(enemies)]
+        self._build_operators(operators)
+        self._build_items()
+        self._build_enemies()
+        self._build_stages()
+
+    def _build_operators(self, count):
+        names = ["娜仁图亚"] + [f"干员{i:03d}" for i in range(1, count)]
+        for i, name in enumerate(names):
+            profession = PROFESSIONS[i % len(PROFESSIONS)]
+            rarity = 5 if name == "娜仁图亚" else self.random.choice([0, 1, 2, 2, 3, 3, 3, 4, 4, 5])
+            tags = "、".join(self.random.sample(RECRUIT_TAGS, self.random.randint(1, 3)))
+            self.chara.append({
+                "page": name, "cn": name, "profession": profession, "position": POSITIONS[profession],
+                "rarity": str(rarity), "tag": tags,
+                "obtain": "公开招募、标准寻访" if self.random.random() < 0.6 else "标准寻访",
+            })
+            self.categories[name] = "干员"
+            self.images += [f"立绘 {name} 1.png", f"立绘 {name} 2.png"]
+            self.pages[name] = (
+                f"{{{{干员信息\n|干员名={name}\n|职业={profession}\n|分支=[[{profession}分支|分支{i % 6}]]\n"
+                f"|稀有度={rarity}\n|特性=攻击造成{{{{color|#00B0FF|法术伤害}}}}，"
+                f"对'''[[空中单位]]'''造成额外伤害\n|特性备注=\n|标签={tags}\n}}}}\n"
+                + "==干员档案==\n" + "档案内容。" * 400
+            )
+
+    def _build_items(self):
+        self.categories["娜仁图亚的信物"] = "道具"
+        self.pages["娜仁图亚的信物"] = (
+            "{{道具信息\n|描述=一枚磨损的狼牙。\n|用途=用于提升娜仁图亚的潜能。\n"
+            "|获得方式=招募娜仁图亚时获得\n|分类=信物\n}}"
+        )
+
+    def _build_enemies(self):
+        records = []
+        for name in self.enemy_names:
+            records.append({
+                "name": name,
+                "enemyRace": self.random.choice(ENEMY_RACES),
+                "enemyLevel": self.random.choice(ENEMY_LEVELS),
+                "attackType": self.random.choice(["近战", "远程", "不攻击"]),
+                "damageType": self.random.choice(["物理", "法术", "无"]),
+                "motion": self.random.choice(["地面", "空中"]),
+                "description": f"[[{name}]]的描述。",
+                "ability": "对'''[[空中单位]]'''造成伤害" if self.random.random() < 0.3 else "",
+                "endure": self.random.choice("ABCDE"),
+                "attack": self.random.choice("ABCDE"),
+                "defence": self.random.choice("ABCDE"),
+                "moveSpeed": self.random.choice([0.5, 0.8, 1, 1.1, 1.9]),
+                "attackSpeed": self.random.choice("ABCDE"),
+                "resistance": self.random.choice("ABCDE"),
+                "maxHp": self.random.randrange(1000, 60000, 50),
+                "atk": self.random.randrange(0, 2000, 10),
+                "def": self.random.randrange(0, 1500, 10),
+                "magicResistance": self.random.choice([0, 10, 20, 30, 50]),
+                "baseAttackTime": self.random.choice([1.5, 2, 2.5, 3, 4]),
+                "massLevel": self.random.randint(0, 5),
+                "rangeRadius": self.random.choice([0, 1, 1.5, 2.5]),
+            })
+        self.pages["敌人一览/数据"] = "\n".join(json.dumps(record, ensure_ascii=False) for record in records)
+        for record in records:
+            self.pages[record["name"]] = self._enemy_page(record)
+
+    @staticmethod
+    def _enemy_page(record):
+        """敌人页面，基础信息和0级数值与「敌人一览/数据」中的记录一致"""
+        level = ENEMY_LEVEL_NAMES[record["enemyLevel"]]
+        return (
+            f"{{{{敌人信息/common2\n|名称={record['name']}\n|种类={record['enemyRace']}\n|地位级别={level}\n"
+            f"|攻击方式={record['attackType']}\n|伤害类型={record['damageType']}\n|行动方式={record['motion']}\n"
+            f"|描述={record['description']}\n|能力={record['ability']}\n}}}}\n"
+            f"{{{{敌人信息/levelcontent\n|index=0\n|最大生命值={record['maxHp']}\n|攻击力={record['atk']}\n"
+            f"|防御力={record['def']}\n|法术抗性={record['magicResistance']}\n|攻击间隔={record['baseAttackTime']}\n"
+            f"|移动速度={record['moveSpeed']}\n|重量等级={record['massLevel']}\n|攻击范围={record['rangeRadius']}\n}}}}"
+        )
+
+    # 关卡敌人模板的参数名，顺序与渲染后敌人表格的12列一致
+    STAGE_ROW_KEYS = ["数量", "地位", "等级", "生命值", "攻击力", "防御力", "法术抗性", "攻击间隔", "重量", "移动速度",
+                      "攻击范围", "目标价值"]
+
+    def _stage_values(self):
+        return [str(self.random.randint(1, 20)), self.random.choice(['普通', '精英', '领袖']),
+                str(self.random.randint(0, 2)), str(self.random.randint(1000, 60000)),
+                str(self.random.randint(100, 2000)), str(self.random.randint(0, 1500)),
+                str(self.random.randint(0, 70)), self.random.choice(['1.7', '2', '3.5']),
+                str(self.random.randint(1, 6)), self.random.choice(['0.5', '0.9', '1.1']), "0", "1"]
+
+    def _stage_row(self, name, values):
+        params = "".join(f"|{key}={value}\n" for key, value in zip(self.STAGE_ROW_KEYS, values))
+        return f"{{{{关卡敌人\n|名称=[[{name}]]\n{params}}}}}"
+
+    def _build_stages(self):
+        # 关卡→[(敌人名称, 12项数值)]，wikitext和渲染后的表格由同一份数据生成
+        self.stage_rows = {}
+        self.stage_rows["SS-8"] = [(name, self._stage_values())
+                                   for name in self.random.sample(self.enemy_names, STAGE_ENEMY_ROWS)]
+        rows = "\n".join(self._stage_row(name, values) for name, values in self.stage_rows["SS-8"])
+        self.pages["SS-8"] = (
+            "{{关卡信息\n|关卡id=act_ss_ex08\n|关卡名=SS-8\n|推荐等级=精英2 70级\n}}\n"
+            "==敌人==\n" + rows + "\n==关卡说明==\n" + "关卡说明。" * 200
+        )
+        # 敌人表不在wikitext中的关卡，需要请求渲染后的页面
+        self.stage_rows["1-7"] = [(name, self._stage_values()) for name in self.random.sample(self.enemy_names, 8)]
+        self.pages["1-7"] = "{{关卡信息\n|关卡id=main_01-07\n|关卡名=1-7\n}}\n==敌人==\n{{关卡敌人表}}"
+        self.redirects["ss-8"] = "SS-8"
+        self.categories.update({"SS-8": "关卡", "1-7": "关卡"})
+
+    def _stage_html(self, title):
+        rows = []
+        for name, values in self.stage_rows.get(title, []):
+            cells = "".join(f"<td>{value}</td>" for value in values)
+            rows.append(f'<tr><td><div class="enemyicon"><a href="/w/{name}" title="{name}">{name}</a></div></td>'
+                        f"<td>{name}</td>{cells}</tr>")
+        return f'<div class="mw-parser-output"><h2>{title}</h2><table>{"".join(rows)}</table></div>'
+
+    @staticmethod
+    def page_id(title):
+        return int(hashlib.md5(title.encode('utf-8')).hexdigest()[:6], 16)
+
+    def revision_id(self, title):
+        return int(hashlib.md5((title + self.pages[title]).encode('utf-8')).hexdigest()[:8], 16)
+
+    def _resolve(self, titles):
+        normalized, redirects, finals = [], [], []
+        for title in titles:
+            final = title.replace("_", " ")
+            if final != title:
+                normalized.append({"from": title, "to": final})
+            if final in self.redirects:
+                redirects.append({"from": final, "to": self.redirects[final]})
+                final = self.redirects[final]
+            finals.append(final)
+        return normalized, redirects, finals
+
+    def _query_pages(self, params):
+        titles = params["titles"].split("|")
+        normalized, redirects, finals = self._resolve(titles)
+        pages = {}
+        for missing_id, title in enumerate(dict.fromkeys(finals), start=1):
+            if params.get("prop") == "imageinfo":
+                file_name = title.split(":", 1)[-1].replace(" ", "_")
+                pages[str(self.page_id(title))] = {"ns": 6, "title": title, "imageinfo": [{
+                    "url": SearchModel.build_image_url(title),
+                    "descriptionurl": f"https://prts.wiki/w/文件:{file_name}"}]}
+            elif title not in self.pages:
+                pages[str(-missing_id)] = {"ns": 0, "title": title, "missing": ""}
+            else:
+                revision = {"revid": self.revision_id(title), "parentid": 0}
+                if "content" in params.get("rvprop", ""):
+                    revision.update(contentformat="text/x-wiki", contentmodel="wikitext", **{"*": self.pages[title]})
+                pages[str(self.page_id(title))] = {"pageid": self.page_id(title), "ns": 0, "title": title,
+                                                   "revisions": [revision]}
+        query = {"pages": pages}
+        if normalized:
+            query["normalized"] = normalized
+        if redirects:
+            query["redirects"] = redirects
+        return {"batchcomplete": "", "query": query}
+
+    def _search(self, params):
+        keyword = normalize_name(params["srsearch"])
+        hits = [title for title in self.pages if keyword and keyword in normalize_name(title)]
+        hits.sort(key=len)
+        return {"batchcomplete": "", "query": {
+            "searchinfo": {"totalhits": len(hits)},
+            "search": [{"ns": 0, "title": title, "pageid": self.page_id(title), "size": len(self.pages[title]),
+                        "snippet": "", "timestamp": "2025-01-01T00:00:00Z"} for title in hits[:10]]}}
+
+    def _parse(self, params):
+        title = self.redirects.get(params["page"], params["page"])
+        if title not in self.pages:
+            return {"error": {"code": "missingtitle", "info": "The page you specified doesn't exist."}}
+        return {"parse": {"title": title, "pageid": self.page_id(title), "revid": self.revision_id(title),
+                          "text": {"*": self._stage_html(title)}, "wikitext": {"*": self.pages[title]}}}
+
+    def _cargoquery(self, params):
+        if params["tables"] == "chara":
+            rows = [{"page": row["page"], "cn": row["cn"]} for row in self.chara]
+        else:
+            rows = [{key: row[key] for key in ("profession", "position", "rarity", "tag", "cn")}
+                    for row in self.chara if "公开招募" in row["obtain"]]
+        return {"cargoquery": [{"title": row} for row in rows]}
+
+    def _log_change(self, title, **fields):
+        rcid = len(self.changes) + 1
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        self.changes.append({"ns": 0, "title": title, "rcid": rcid, "timestamp": timestamp, **fields})
+
+    def edit(self, title, wikitext):
+        """编辑（或新建）页面，并记录到recentchanges"""
+        change_type = "edit" if title in self.pages else "new"
+        self.pages[title] = wikitext
+        self._log_change(title, type=change_type, pageid=self.page_id(title), revid=self.revision_id(title))
+
+    def delete(self, title):
+        del self.pages[title]
+        self.categories.pop(title, None)
+        self._log_change(title, type="log", logtype="delete", logaction="delete")
+
+    def move(self, title, target):
+        self.pages[target] = self.pages.pop(title)
+        if title in self.categories:
+            self.categories[target] = self.categories.pop(title)
+        self._log_change(title, type="log", logtype="move", logaction="move", logparams={"target_title": target})
+
+    def _recentchanges(self, params):
+        if params.get("rcdir") == "newer":
+            changes = [change for change in self.changes if change["timestamp"] >= params.get("rcstart", "")]
+        else:
+            changes = self.changes[::-1]
+        limit = params.get("rclimit", "max")
+        changes = changes[:500 if limit == "max" else int(limit)]
+        return {"batchcomplete": "", "query": {"recentchanges": changes}}
+
+    def _categories(self, params):
+        wanted = {title.split(":", 1)[-1] for title in params.get("clcategories", "").split("|")}
+        pages = {}
+        for title in params["titles"].split("|"):
+            page = {"ns": 0, "title": title}
+            if self.categories.get(title) in wanted:
+                page["categories"] = [{"ns": 14, "title": f"Category:{self.categories[title]}"}]
+            pages[str(self.page_id(title))] = page
+        return {"batchcomplete": "", "query": {"pages": pages}}
+
+    @staticmethod
+    def _page_slice(params, prefix, titles):
+        """按标题排序后分页，返回(本页标题, 续传参数)"""
+        limit = params.get(f"{prefix}limit", "max")
+        limit = 500 if limit == "max" else int(limit)
+        start = int(params.get(f"{prefix}continue", 0))
+        end = start + limit
+        cont = {f"{prefix}continue": str(end), "continue": f"{prefix}continue||"} if end < len(titles) else None
+        return titles[start:end], cont
+
+    def _generator(self, params):
+        if params["generator"] == "categorymembers":
+            category = params["gcmtitle"].split(":", 1)[-1]
+            prefix, titles = "gcm", sorted(title for title, value in self.categories.items() if value == category)
+        elif params.get("gapfilterredir") == "redirects":
+            prefix, titles = "gap", sorted(self.redirects)
+        else:
+            prefix, titles = "gap", sorted(self.pages)
+        titles, cont = self._page_slice(params, prefix, titles)
+        query = {}
+        if prefix == "gap" and params.get("gapfilterredir") == "redirects":
+            query["redirects"] = [{"from": title, "to": self.redirects[title]} for title in titles]
+            titles = list(dict.fromkeys(self.redirects[title] for title in titles))
+        query["pages"] = {str(self.page_id(title)): {"pageid": self.page_id(title), "ns": 0, "title": title,
+                                                     "lastrevid": self.revision_id(title),
+                                                     "length": len(self.pages[title])} for title in titles}
+        data = {"batchcomplete": "", "query": query}
+        if cont:
+            data["continue"] = cont
+        return data
+
+    def _allimages(self, params):
+        names, cont = self._page_slice(params, "ai", sorted(self.images))
+        data = {"batchcomplete": "", "query": {"allimages": [
+            {"name": name.replace(" ", "_"), "title": f"文件:{name}",
+             "url": SearchModel.build_image_url(name)} for name in names]}}
+        if cont:
+            data["continue"] = cont
+        return data
+
+    def handle(self, request: httpx.Request):
+        params = dict(request.url.params)
+        action = params.get("action")
+        if action == "query" and params.get("list") == "search":
+            data = self._search(params)
+        elif action == "query" and "generator" in params:
+            data = self._generator(params)
+        elif action == "query" and params.get("list") == "allimages":
+            data = self._allimages(params)
+        elif action == "query" and params.get("list") == "recentchanges":
+            data = self._recentchanges(params)
+        elif action == "query" and params.get("prop") == "categories":
+            data = self._categories(params)
+        elif action == "query" and "titles" in params:
+            data = self._query_pages(params)
+        elif action == "parse":
+            data = self._parse(params)
+        elif action == "cargoquery":
+            data = self._cargoquery(params)
+        else:
+            data = {"error": {"code": "badvalue", "info": f"Unsupported request: {params}"}}
+        return httpx.Response(200, json=data)
+
+    def transport(self):
+        return httpx.MockTransport(self.handle)
@@ -0,0 +1,104 @@
+import math
+
+"""
+敌人各等级的数值：解析时统一转换为int/float，之后可直接比较和计算，无需重复int()/float()
+"""
+
+# 各数值在敌人页面levelcontent模板（或数据记录）中可能使用的参数名
+LEVEL_STAT_KEYS = {
+    'hp': ('最大生命值', '生命值', 'maxHp', 'endure'),
+    'atk': ('攻击力', 'atk', 'attack'),
+    'defence': ('防御力', 'def', 'defence'),
+    'res': ('法术抗性', 'magicResistance', 'resistance'),
+    'attack_interval': ('攻击间隔', '攻击速度', 'baseAttackTime', 'attackSpeed'),
+    'move_speed': ('移动速度', 'moveSpeed'),
+    'weight': ('重量等级', '重量', 'massLevel'),
+    'attack_range': ('攻击范围', '攻击距离', 'rangeRadius'),
+    'damage_res': ('损伤抵抗', '伤害抵抗', 'damageResistance'),
+}
+# 未填写时视为空值的写法
+EMPTY_VALUES = ("", "-", "—", "--", "无", "?", "？")
+
+
+def parse_number(value):
+    """将数值文本转换为int或float，如 "1,050"→1050、"1.7"→1.7、"20%"→20.0，无法转换时返回None"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value if not (isinstance(value, float) and math.isnan(value)) else None
+    text = str(value).strip().replace(",", "").replace("，", "")
+    if text in EMPTY_VALUES:
+        return None
+    if text.endswith(("%", "％")):
+        text = text[:-1]
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return None
+
+
+class EnemyLevel:
+    """敌人某一等级的数值，未填写或无法解析的数值为None"""
+
+    __slots__ = ('index',) + tuple(LEVEL_STAT_KEYS)
+
+    def __init__(self, index=0, **values):
+        self.index = index
+        for name in LEVEL_STAT_KEYS:
+            setattr(self, name, values.get(name))
+
+    @classmethod
+    def from_params(cls, index, params: dict, base=None):
+        """由模板参数生成，未填写的数值沿用base（通常为0级）的值"""
+        values = {}
+        for name, keys in LEVEL_STAT_KEYS.items():
+            # 取第一个能解析为数值的参数（数据记录中同一数值可能同时有评级和数值两种写法）
+            value = next((number for number in (parse_number(params[key]) for key in keys if key in params)
+                          if number is not None), None)
+            if value is None and base is not None:
+                value = getattr(base, name)
+            values[name] = value
+        return cls(index, **values)
+
+    def has_values(self):
+        return any(getattr(self, name) is not None for name in LEVEL_STAT_KEYS)
+
+    def __eq__(self, other):
+        if not isinstance(other, EnemyLevel):
+            return NotImplemented
+        return self._asdict() == other._asdict()
+
+    def _asdict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"EnemyLevel({values})"
+
+
+def parse_levels(templates):
+    """
+    由敌人页面的levelcontent模板（按出现顺序）得到全部等级，按等级编号排序
+    等级编号取index参数，没有时按出现顺序编号；各等级未填写的数值沿用最低等级的值
+    """
+    indexed = []
+    for position, template in enumerate(templates):
+        index = parse_number(template.get("index"))
+        indexed.append((index if isinstance(index, int) else position, template))
+    indexed.sort(key=lambda item: item[0])
+    levels = []
+    for index, template in indexed:
+        levels.append(EnemyLevel.from_params(index, template.params, levels[0] if levels else None))
+    return tuple(levels)
+
+
+def format_number(value):
+    """输出数值，整数不带小数点，空值输出为“-”"""
+    if value is None:
+        return "-"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
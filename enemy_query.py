@@ -0,0 +1,308 @@
+import re, json, math, heapq, operator, logging
+from array import array
+from itertools import compress, repeat
+from collections import namedtuple
+from enemy_levels import EnemyLevel, format_number
+from enemy_store import LEVEL_NAMES
+from stats import stats
+import stage_enemy
+
+try:
+    import numpy
+except ImportError:  # 没有安装numpy时，用array和内置的map/compress逐列计算
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+"""
+本地敌人条件查询：在「敌人一览/数据」的全部敌人上按列过滤、排序、取前N个和统计
+查询示例：地位=领袖 防御力>1000 排序=-法术抗性 前10
+         种族=感染生物 排序=-生命值 前1
+         伤害类型=法术 统计=攻击力
+"""
+
+# 一次查询的结果：total为满足条件的敌人数，rows为排序、截取后的敌人，aggregates为统计结果
+EnemyQueryResult = namedtuple('EnemyQueryResult', ['total', 'rows', 'aggregates'])
+# 解析后的查询：conditions为(列名, 运算符, 值)列表，sort为排序列（None表示按名称）
+QuerySpec = namedtuple('QuerySpec', ['conditions', 'sort', 'descending', 'limit', 'aggregates'])
+
+DEFAULT_LIMIT = 20
+
+# 数值列（来自EnemyLevel）及查询中可用的名称
+NUMBER_COLUMNS = {
+    'hp': ('生命值', '最大生命值', '耐久', 'hp'),
+    'atk': ('攻击力', '攻击', 'atk'),
+    'defence': ('防御力', '防御', 'def', 'defence'),
+    'res': ('法术抗性', '法抗', 'res'),
+    'attack_interval': ('攻击间隔', '攻击速度', 'interval'),
+    'move_speed': ('移动速度', '移速', 'speed'),
+    'weight': ('重量', '重量等级', 'weight'),
+    'attack_range': ('攻击范围', '攻击距离', 'range'),
+    'damage_res': ('损伤抵抗', '伤害抵抗'),
+}
+# 文本列（来自本地数据库的同名列）及查询中可用的名称
+TEXT_COLUMNS = {
+    'name': ('名称', '敌人', 'name'),
+    'race': ('种族', '种类', 'race'),
+    'level': ('地位', '地位级别', 'level'),
+    'attack_type': ('攻击方式',),
+    'damage_type': ('伤害类型',),
+    'motion': ('行动方式', '移动方式', 'motion'),
+}
+COLUMN_LABELS = {column: names[0] for column, names in {**TEXT_COLUMNS, **NUMBER_COLUMNS}.items()}
+COLUMN_ALIASES = {name: column for column, names in {**TEXT_COLUMNS, **NUMBER_COLUMNS}.items() for name in names}
+
+NUMBER_OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le,
+                    '=': operator.eq, '!=': operator.ne}
+TEXT_OPERATORS = {'=': operator.eq, '!=': operator.ne, '~': operator.contains}
+# 全角符号统一为半角
+OPERATOR_REPLACEMENTS = {'＞': '>', '＜': '<', '＝': '=', '≥': '>=', '≤': '<=', '≠': '!=', '！': '!', '～': '~'}
+CONDITION_PATTERN = re.compile(r'^(.+?)(>=|<=|!=|>|<|=|~)(.*)$')
+LIMIT_PATTERN = re.compile(r'^(?:前|top)(\d+)$', re.IGNORECASE)
+SORT_KEYS = ('排序', 'sort')
+LIMIT_KEYS = ('数量', 'top', 'limit')
+AGGREGATE_KEYS = ('统计', 'stats')
+
+
+def _column(name: str):
+    column = COLUMN_ALIASES.get(name.strip()) or COLUMN_ALIASES.get(name.strip().lower())
+    if column is None:
+        raise ValueError(f"未知的字段: {name}，可用字段: {'、'.join(COLUMN_LABELS.values())}")
+    return column
+
+
+def parse_query(query_text: str):
+    """解析查询文本，格式错误时抛出ValueError"""
+    for full_width, half_width in OPERATOR_REPLACEMENTS.items():
+        query_text = query_text.replace(full_width, half_width)
+    conditions, aggregates = [], []
+    sort, descending, limit = None, False, None
+    for token in re.split(r'[\s,，]+', query_text.strip()):
+        if not token:
+            continue
+        limit_match = LIMIT_PATTERN.match(token)
+        if limit_match:
+            limit = int(limit_match.group(1))
+            continue
+        match = CONDITION_PATTERN.match(token)
+        if not match:
+            raise ValueError(f"无法解析的条件: {token}，格式如 防御力>1000、地位=领袖")
+        key, op, value = match.group(1).strip(), match.group(2), match.group(3).strip()
+        if key in SORT_KEYS and op == '=':
+            descending = value.startswith('-')
+            sort = _column(value.lstrip('-+'))
+        elif key in LIMIT_KEYS and op == '=':
+            if not value.isdigit():
+                raise ValueError(f"数量必须为整数: {value}")
+            limit = int(value)
+        elif key in AGGREGATE_KEYS and op == '=':
+            column = _column(value)
+            if column not in NUMBER_COLUMNS:
+                raise ValueError(f"只能统计数值字段: {value}")
+            aggregates.append(column)
+        else:
+            column = _column(key)
+            if column in NUMBER_COLUMNS:
+                if op not in NUMBER_OPERATORS:
+                    raise ValueError(f"数值字段不支持运算符 {op}: {token}")
+                try:
+                    value = float(value.rstrip('%％'))
+                except ValueError:
+                    raise ValueError(f"{COLUMN_LABELS[column]}的条件值必须为数字: {token}") from None
+            else:
+                if op not in TEXT_OPERATORS:
+                    raise ValueError(f"文本字段只支持 =、!=、~（包含）: {token}")
+                if column == 'level':
+                    value = LEVEL_NAMES.get(value.upper(), value)
+            conditions.append((column, op, value))
+    return QuerySpec(conditions, sort, descending, limit, aggregates)
+
+
+class EnemyTable:
+    """
+    敌人数据的列存储：每个数值列为一个float数组（缺失值为NaN），每个文本列为一个字符串列表
+    过滤时每个条件对整列计算一次布尔掩码，再按位与合并
+    """
+
+    def __init__(self, records):
+        self.text = {column: [] for column in TEXT_COLUMNS}
+        numbers = {column: array('d') for column in NUMBER_COLUMNS}
+        for record in records:
+            raw = json.loads(record["raw"]) if record.get("raw") else {}
+            level = EnemyLevel.from_params(0, raw)
+            for column in TEXT_COLUMNS:
+                value = record.get(column) or ""
+                self.text[column].append(LEVEL_NAMES.get(value, value) if column == 'level' else value)
+            for column in NUMBER_COLUMNS:
+                value = getattr(level, column)
+                numbers[column].append(math.nan if value is None else float(value))
+        # 各数值列的有效（非缺失）数量，数据中只有评级而没有具体数值时为0
+        self.number_counts = {column: sum(value == value for value in values) for column, values in numbers.items()}
+        self.numbers = {column: numpy.array(values) for column, values in numbers.items()} if numpy else numbers
+        self.size = len(self.text['name'])
+
+    def __len__(self):
+        return self.size
+
+    def _mask(self, column, op, value):
+        """计算一个条件的布尔掩码，缺失的数值不满足任何条件"""
+        if column in NUMBER_COLUMNS:
+            values = self.numbers[column]
+            if numpy is not None:
+                mask = NUMBER_OPERATORS[op](values, value)
+                return mask & ~numpy.isnan(values) if op == '!=' else mask
+            mask = map(NUMBER_OPERATORS[op], values, repeat(value))
+            # NaN与自身不相等，用于排除缺失值
+            return list(map(operator.and_, mask, map(operator.eq, values, values))) if op == '!=' else list(mask)
+        mask = list(map(TEXT_OPERATORS[op], self.text[column], repeat(value)))
+        return numpy.array(mask, dtype=bool) if numpy is not None else mask
+
+    def filter(self, conditions):
+        """返回满足全部条件的行号"""
+        if numpy is not None:
+            mask = numpy.ones(self.size, dtype=bool)
+            for condition in conditions:
+                mask &= self._mask(*condition)
+            return numpy.flatnonzero(mask)
+        mask = None
+        for condition in conditions:
+            condition_mask = self._mask(*condition)
+            mask = condition_mask if mask is None else list(map(operator.and_, mask, condition_mask))
+        return list(range(self.size)) if mask is None else list(compress(range(self.size), mask))
+
+    def order(self, indices, column, descending=False, limit=None):
+        """按列排序并取前limit个，缺失值排在最后；数值列取前N个时只做部分排序"""
+        if column is None:
+            column = 'name'
+        if limit is not None and limit <= 0:
+            return []
+        if column in TEXT_COLUMNS:
+            values = self.text[column]
+            ordered = sorted(indices, key=lambda i: (values[i] == "", values[i]))
+            if descending:
+                filled = [i for i in ordered if values[i]]
+                ordered = filled[::-1] + ordered[len(filled):]
+            return list(ordered[:limit])
+        values = self.numbers[column]
+        if numpy is not None:
+            indices = numpy.asarray(indices, dtype=numpy.intp)
+            keys = -values[indices] if descending else values[indices]  # NaN在排序中总是排在最后
+            if limit is not None and limit < len(indices):
+                part = numpy.argpartition(keys, limit - 1)[:limit]
+                order = part[numpy.argsort(keys[part], kind='stable')]
+            else:
+                order = numpy.argsort(keys, kind='stable')
+            return indices[order].tolist()
+        sign = -1.0 if descending else 1.0
+        key = lambda i: (values[i] != values[i], sign * values[i])
+        if limit is not None and limit < len(indices):
+            return heapq.nsmallest(limit, indices, key=key)
+        return sorted(indices, key=key)
+
+    def aggregate(self, indices, column):
+        """统计数值列：有效数量、最小、最大、平均值，以及最大值对应的敌人"""
+        values = self.numbers[column]
+        if numpy is not None:
+            indices = numpy.asarray(indices, dtype=numpy.intp)
+            valid = indices[~numpy.isnan(values[indices])]
+            column_values = values[valid]
+        else:
+            valid = [i for i in indices if values[i] == values[i]]
+            column_values = [values[i] for i in valid]
+        if not len(valid):
+            return {"count": 0, "min": None, "max": None, "mean": None, "max_name": None}
+        max_position = max(range(len(valid)), key=column_values.__getitem__)
+        return {
+            "count": len(valid),
+            "min": float(min(column_values)),
+            "max": float(column_values[max_position]),
+            "mean": round(math.fsum(column_values) / len(valid), 3),
+            "max_name": self.text['name'][int(valid[max_position])],
+        }
+
+    def row(self, index):
+        row = {column: values[index] for column, values in self.text.items()}
+        for column, values in self.numbers.items():
+            value = float(values[index])
+            row[column] = None if math.isnan(value) else (int(value) if value.is_integer() else value)
+        return row
+
+    def check_columns(self, spec: QuerySpec):
+        """查询用到的数值列在全部敌人中都没有数值时抛出ValueError，而不是返回空结果"""
+        columns = [column for column, op, value in spec.conditions] + [spec.sort] + list(spec.aggregates)
+        missing = [column for column in dict.fromkeys(columns)
+                   if column in NUMBER_COLUMNS and self.size and not self.number_counts[column]]
+        if missing:
+            labels = "、".join(COLUMN_LABELS[column] for column in missing)
+            raise ValueError(f"敌人数据中没有{labels}的具体数值（可能只有评级），无法按该字段查询")
+
+    def execute(self, spec: QuerySpec):
+        self.check_columns(spec)
+        indices = self.filter(spec.conditions)
+        total = len(indices)
+        limit = DEFAULT_LIMIT if spec.limit is None else spec.limit
+        ordered = self.order(indices, spec.sort, spec.descending, limit)
+        aggregates = {column: self.aggregate(indices, column) for column in spec.aggregates}
+        return EnemyQueryResult(total, [self.row(index) for index in ordered], aggregates)
+
+
+class EnemyQuery:
+    def __init__(self, config=None):
+        self.config = config
+        self.stage_enemy = stage_enemy.initialize_stage_enemy(config)
+        self.table = None
+        self.table_version = None  # 构建列存储时敌人数据的版本，数据替换后重建
+
+    async def get_table(self):
+        """返回敌人数据的列存储，首次使用或敌人数据更新后重新构建"""
+        await self.stage_enemy.ensure_enemy_data()
+        version = self.stage_enemy.data_version
+        if self.table is None or self.table_version != version:
+            with stats.timer("enemy_query.build_table"):
+                self.table = EnemyTable(self.stage_enemy.enemy_store.all_records())
+            self.table_version = version
+            logger.info(f"已构建敌人列存储，共 {len(self.table)} 个敌人")
+        return self.table
+
+    @stats.timed("enemy_query.query")
+    async def query(self, query_text: str):
+        """执行条件查询，查询格式错误时抛出ValueError"""
+        spec = parse_query(query_text)
+        table = await self.get_table()
+        with stats.timer("enemy_query.execute"):
+            return table.execute(spec)
+
+    async def run(self, query_text=None):
+        if query_text is None:
+            print("格式：字段 运算符 值，空格分隔；运算符 > >= < <= = != ~(包含)")
+            print("排序=字段（-字段为从大到小），前N 取前N个，统计=字段")
+            print(f"字段：{'、'.join(COLUMN_LABELS.values())}")
+            query_text = input("请输入查询条件（如：地位=领袖 防御力>1000 排序=-法术抗性 前10）：")
+        try:
+            result = await self.query(query_text)
+        except ValueError as e:
+            print(e)
+            return None
+        print(f"共 {result.total} 个敌人满足条件，显示 {len(result.rows)} 个")
+        for row in result.rows:
+            numbers = "，".join(f"{COLUMN_LABELS[column]} {format_number(row[column])}" for column in NUMBER_COLUMNS
+                               if row[column] is not None)
+            print(f"{row['name']}（{row['level'] or '-'}，{row['race'] or '无'}）：{numbers or '无数值'}")
+        for column, aggregate in result.aggregates.items():
+            if aggregate["count"]:
+                print(f"{COLUMN_LABELS[column]}：数量 {aggregate['count']}，最小 {format_number(aggregate['min'])}，"
+                      f"最大 {format_number(aggregate['max'])}（{aggregate['max_name']}），"
+                      f"平均 {format_number(aggregate['mean'])}")
+            else:
+                print(f"{COLUMN_LABELS[column]}：无数据")
+        return result
+
+
+# 延迟初始化
+enemy_query_instance = None
+
+def initialize_enemy_query(config):
+    global enemy_query_instance
+    if enemy_query_instance is None:
+        enemy_query_instance = EnemyQuery(config)
+    return enemy_query_instance
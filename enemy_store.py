@@ -0,0 +1,121 @@
+import sqlite3, json, logging
+
+logger = logging.getLogger(__name__)
+
+# 本地存储的字段，及其在「敌人一览/数据」记录中可能使用的键名
+# 记录中的数值同时有评级（如endure: "C"）和具体数值（如maxHp: 2000）两种写法，具体数值优先
+ENEMY_COLUMNS = {
+    'race': ('enemyRace', 'race', '种类', '种族'),
+    'level': ('enemyLevel', 'level', '地位级别', '地位'),
+    'attack_type': ('attackType', 'attack_type', '攻击方式'),
+    'damage_type': ('damageType', 'damage_type', '伤害类型'),
+    'motion': ('motion', '行动方式'),
+    'describe': ('description', 'describe', '描述'),
+    'ability': ('ability', 'abilityList', '能力'),
+    'endure': ('maxHp', 'hp', '最大生命值', '生命值', 'endure'),
+    'attack': ('atk', '攻击力', 'attack'),
+    'defence': ('def', '防御力', 'defence'),
+    'move_speed': ('moveSpeed', 'move_speed', '移动速度'),
+    'attack_speed': ('baseAttackTime', '攻击间隔', '攻击速度', 'attackSpeed', 'attack_speed'),
+    'resistance': ('magicResistance', 'res', '法术抗性', 'resistance'),
+}
+# 记录中的地位级别为代码，统一为敌人页面中的中文写法
+LEVEL_NAMES = {'NORMAL': '普通', 'ELITE': '精英', 'BOSS': '领袖'}
+
+# 具备以下字段时，无需再请求敌人页面
+REQUIRED_COLUMNS = ('race', 'level', 'attack_type', 'damage_type', 'endure', 'attack', 'defence', 'resistance')
+
+
+def _to_text(value):
+    """将记录中的值统一转换为字符串"""
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return "、".join(_to_text(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value).strip()
+
+
+def extract_columns(record: dict):
+    """从原始记录中取出本地存储的各字段"""
+    columns = {}
+    for column, keys in ENEMY_COLUMNS.items():
+        columns[column] = next((_to_text(record[key]) for key in keys if key in record), "")
+    return columns
+
+
+class EnemyStore:
+    """敌人完整数据的本地存储（SQLite），以敌人名称为主键"""
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._conn = None
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_file)
+        conn.row_factory = sqlite3.Row
+        columns = ", ".join(f"{column} TEXT" for column in ENEMY_COLUMNS)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS enemy (name TEXT PRIMARY KEY, {columns}, raw TEXT)")
+        conn.execute("CREATE INDEX IF NOT EXISTS enemy_race ON enemy (race)")
+        conn.execute("CREATE INDEX IF NOT EXISTS enemy_level ON enemy (level)")
+        conn.commit()
+        return conn
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = self._open()
+        return self._conn
+
+    def replace_all(self, records: list):
+        """
+        用新数据整体替换本地存储，在一个事务中完成
+        使用单独的连接，可以在线程中调用（asyncio.to_thread），写入期间查询仍读到旧数据
+        """
+        rows = []
+        for record in records:
+            name = _to_text(record.get('name'))
+            if not name:
+                continue
+            columns = extract_columns(record)
+            rows.append((name, *columns.values(), json.dumps(record, ensure_ascii=False)))
+        placeholders = ", ".join("?" * (len(ENEMY_COLUMNS) + 2))
+        conn = self._open()
+        try:
+            with conn:
+                conn.execute("DELETE FROM enemy")
+                conn.executemany(f"INSERT OR REPLACE INTO enemy VALUES ({placeholders})", rows)
+        finally:
+            conn.close()
+        logger.info(f"已写入敌人数据库，共 {len(rows)} 条记录")
+        return len(rows)
+
+    def get(self, name: str):
+        """按名称查询敌人记录，不存在时返回None"""
+        try:
+            row = self._connect().execute("SELECT * FROM enemy WHERE name = ?", (name,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"查询敌人数据库失败: {e}")
+            return None
+        return dict(row) if row else None
+
+    def all_records(self):
+        """返回全部敌人记录（按名称排序），用于构建本地查询的列存储"""
+        try:
+            rows = self._connect().execute("SELECT * FROM enemy ORDER BY name").fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"查询敌人数据库失败: {e}")
+            return []
+        return [dict(row) for row in rows]
+
+    def count(self):
+        try:
+            return self._connect().execute("SELECT COUNT(*) FROM enemy").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"查询敌人数据库失败: {e}")
+            return 0
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -1,9 +1,10 @@
-import re, logging
+import re, logging, asyncio, httpx
 from collections import namedtuple
 from search_model import search_model
+from operator_index import operator_index
+from stats import stats
+from wikitext_parser import parse_page, clean_wikitext
 
-# 配置日志
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 OperatorInfo = namedtuple('OperatorInfo',
@@ -18,11 +19,14 @@ OperatorInfo = namedtuple('OperatorInfo',
 "wikitext": "wikitext"
 """
 
-# 预编译正则表达式以提高性能
-COLOR_PATTERN = re.compile(r'\{\{color\|#[0-9A-F]{6}\|(.*?)}}')
-LINK_PATTERN_1 = re.compile(r'\[\[([^]|]+)\|([^]]+)]]')
-LINK_PATTERN_2 = re.compile(r'\[\[([^]]+)]]')
-BOLD_ITALIC_PATTERN = re.compile(r"''+(.*?)''+")
+# 干员页面中各字段的模板参数名
+FIELD_KEYS = {
+    'zhi_ye': '职业',
+    'fen_zhi': '分支',
+    'xing_ji': '稀有度',
+    'te_xing': '特性',
+    'te_xing_b': '特性备注',
+}
 
 
 class Ganyuan:
@@ -30,30 +34,6 @@ class Ganyuan:
         self.config = config
         self.image_output = self.config["image"]["ganyuan_image_output"]
 
-        # 预编译字段正则表达式
-        self.field_patterns = {
-            'zhi_ye': re.compile(r"\|职业\s*=\s*(.+)"),
-            'fen_zhi': re.compile(r"\|分支\s*=\s*(.+)"),
-            'xing_ji': re.compile(r"\|稀有度\s*=\s*(.+)"),
-            'te_xing': re.compile(r"\|特性\s*=\s*(.+)"),
-            'te_xing_b': re.compile(r"\|特性备注\s*=\s*\s*(.+)"),
-        }
-
-    def clean_wikitext(self, text):
-        """清理wikitext中的标记，提取纯文本内容（同步版本）"""
-        if not text:
-            return ""  # 返回空字符串而不是None
-
-        # 移除颜色标记 {{color|#00B0FF|回旋投射物}}
-        text = COLOR_PATTERN.sub(r'\1', text)
-
-        # 移除其他常见的wikitext标记
-        text = LINK_PATTERN_1.sub(r'\2', text)  # [[链接|显示文字]] -> 显示文字
-        text = LINK_PATTERN_2.sub(r'\1', text)  # [[链接]] -> 链接
-        text = BOLD_ITALIC_PATTERN.sub(r'\1', text)  # 移除粗体和斜体标记
-        text = text.replace('*', '')
-        return text.strip()
-
     async def get_operator_image(self, name: str, skin):
         """异步获取干员的image，默认为精二皮"""
         name = re.sub(r'[（）]', lambda m: {'（': '(', '）': ')'}.get(m.group(0)), name)
@@ -62,52 +42,81 @@ class Ganyuan:
         name = f"文件:立绘 {name} {skin}.png"
         return await search_model.get_images_url([name])
 
+    async def resolve_operator_name(self, name: str):
+        """将输入解析为页面标题，优先使用本地干员索引，未命中时才请求搜索接口"""
+        if search_model.is_known_title(name):
+            return name
+        title = await operator_index.lookup(name)
+        if title:
+            return title
+        return await search_model.search_wikitext(name)
+
     async def get_operator_info_concurrently(self, name: str, skin="2"):
-        """并发获取干员信息和图片，提高处理速度"""
+        """
+        并发获取干员信息和图片，提高处理速度
+        返回(页面标题, wikitext, 图片, 修订版本号)，版本号按请求的标题从缓存中取得，与wikitext对应
+        """
         try:
-            name = await search_model.search_wikitext(name)
-            name_out, wikitext = await search_model.get_wikitext(name)
+            title = await self.resolve_operator_name(name)
+            if not title:
+                return name, None, [], None
             if self.image_output:
-                image_url = await self.get_operator_image(name, skin)
+                # 图片只依赖标题，与wikitext同时请求
+                (name_out, wikitext), image_url = await asyncio.gather(
+                    search_model.get_wikitext(title),
+                    self.get_operator_image(title, skin)
+                )
             else:
+                name_out, wikitext = await search_model.get_wikitext(title)
                 image_url = ""
-            return name_out, wikitext, image_url
-        except (search_model.httpx.HTTPStatusError, search_model.httpx.RequestError) as e:
+            return name_out, wikitext, image_url, search_model.cached_revision_id(title)
+        except (httpx.HTTPStatusError, httpx.RequestError) as e:
             logger.error(f"获取干员信息失败: {e}")
-            return name, None, []
+            return name, None, [], None
         except Exception as e:
             logger.error(f"获取干员信息时发生未知错误: {e}")
-            return name, None, []
+            return name, None, [], None
+
+    @staticmethod
+    def parse_fields(page):
+        """从干员页面（PageTemplates）中读取各字段，字段不存在或为空时为None"""
+        results = {}
+        for field_name, key in FIELD_KEYS.items():
+            raw_value = page.param(key)
+            if not raw_value:
+                results[field_name] = None
+            elif field_name == 'xing_ji':
+                # 处理稀有度，页面中为0~5
+                results[field_name] = f"{int(raw_value) + 1}星" if raw_value.isdigit() else raw_value
+            else:
+                results[field_name] = clean_wikitext(raw_value)
+        return results
 
+    @stats.timed("ganyuan.query")
     async def clean_over_wiki(self, ganyuan, skin):
         # 并发获取干员信息和图片，提高处理速度
-        name, wikitext, image = await self.get_operator_info_concurrently(ganyuan, skin)
+        name, wikitext, image, revid = await self.get_operator_info_concurrently(ganyuan, skin)
 
         if not wikitext:
             return None, None
 
-        # 批量处理正则表达式查找和结果处理
-        results = {}
-
-        for field_name, pattern in self.field_patterns.items():
-            match = pattern.search(wikitext)
-            if match:
-                raw_value = match.group(1)
-                if field_name in ['zhi_ye', 'fen_zhi', 'te_xing', 'te_xing_b']:
-                    # 直接同步处理wikitext清理，避免异步开销
-                    results[field_name] = self.clean_wikitext(raw_value)
-                elif field_name == 'xing_ji':
-                    # 处理稀有度
-                    results[field_name] = str(f"{int(raw_value.strip()) + 1}星")
-                else:
-                    results[field_name] = raw_value
-            else:
-                results[field_name] = None
+        page = parse_page(wikitext, name, revid)
+        with stats.timer("ganyuan.parse"):
+            results = self.parse_fields(page)
 
         # 返回图片和操作员信息
         return image, OperatorInfo(name, results['zhi_ye'], results['fen_zhi'],
                                    results['xing_ji'], results['te_xing'], results['te_xing_b'], wikitext)
 
+    async def query(self, ganyuan: str):
+        """解析“干员名 皮肤”形式的输入并查询，返回(image, OperatorInfo)"""
+        parts = re.split(r'[\s,，]+', ganyuan)
+        parts = [part.strip() for part in parts if part.strip()]
+        # 处理输入参数不足的情况，提供默认值
+        ganyuan_name = parts[0] if len(parts) > 0 else ""
+        skin = parts[1] if len(parts) > 1 else "2"
+        return await self.clean_over_wiki(ganyuan_name, skin)
+
     async def run(self, ganyuan=None):
         if ganyuan is None:
             ganyuan = input("请输入干员名称：")
@@ -116,12 +125,7 @@ class Ganyuan:
         result含有的参数（按顺序）：
         name, zhi_ye, fen_zhi, xing_ji, te_xing, te_xing_b, wikitext
         """
-        parts = re.split(r'[\s,，]+', ganyuan)
-        parts = [part.strip() for part in parts if part.strip()]
-        # 处理输入参数不足的情况，提供默认值
-        ganyuan_name = parts[0] if len(parts) > 0 else ""
-        skin = parts[1] if len(parts) > 1 else "2"
-        image, result = await self.clean_over_wiki(ganyuan_name, skin)
+        image, result = await self.query(ganyuan)
         if result:
             # print(wikitext)
             if self.image_output:
@@ -1,14 +1,122 @@
-import httpx, re
+import httpx, re, os, json, time, asyncio, logging
+from itertools import combinations
+from collections import namedtuple
+from search_model import search_model
+from stats import stats
+
+logger = logging.getLogger(__name__)
+
+# 标签组合的计算结果
+RecruitResult = namedtuple('RecruitResult', ['tags', 'min_rarity', 'operators'])
+"""
+"tags": 标签组合（元组）,
+"min_rarity": 保底星级（1~6）,
+"operators": 可能招募到的干员（按星级从高到低）
+"""
+
+SENIOR_TAG = "资深干员"
+TOP_SENIOR_TAG = "高级资深干员"
+TAG_SPLIT_PATTERN = re.compile(r'[\s,，、]+')
+
+
+class RecruitTagIndex:
+    """
+    公招标签位图索引：每个标签对应一个整数位掩码，第i位表示第i个干员具有该标签
+    标签组合的匹配结果即为各标签掩码按位与
+    """
+
+    def __init__(self, operators_data):
+        self.operators = []
+        self.tag_masks = {}
+        self.rarity_masks = [0] * 6  # rarity为0~5，对应1~6星
+        for operator in operators_data:
+            try:
+                rarity = int(operator.get("rarity", 0))
+            except (TypeError, ValueError):
+                continue
+            if not 0 <= rarity <= 5:
+                continue
+            bit = 1 << len(self.operators)
+            self.operators.append(operator)
+            self.rarity_masks[rarity] |= bit
+            for tag in self.operator_tags(operator, rarity):
+                self.tag_masks[tag] = self.tag_masks.get(tag, 0) | bit
+        # 6星只有选择高级资深干员时才会出现
+        self.top_mask = self.rarity_masks[5]
+        # 招募时限为9小时时不会出现1、2星干员
+        self.low_mask = self.rarity_masks[0] | self.rarity_masks[1]
+
+    @staticmethod
+    def operator_tags(operator, rarity):
+        """计算干员在公招中具有的全部标签"""
+        tags = set(tag for tag in TAG_SPLIT_PATTERN.split(operator.get("tag") or "") if tag)
+        profession = (operator.get("profession") or "").strip()
+        if profession:
+            tags.add(profession if profession.endswith("干员") else f"{profession}干员")
+        position = (operator.get("position") or "").strip()
+        if position:
+            tags.add(position if position.endswith("位") else f"{position}位")
+        if rarity == 5:
+            tags.add(TOP_SENIOR_TAG)
+        elif rarity == 4:
+            tags.add(SENIOR_TAG)
+        return tags
+
+    def _iter_operators(self, mask):
+        while mask:
+            low = mask & -mask
+            yield self.operators[low.bit_length() - 1]
+            mask ^= low
+
+    def solve(self, input_tags):
+        """计算所有1~3个标签的组合，返回按保底星级从高到低排序的结果"""
+        input_tags = list(dict.fromkeys(input_tags))
+        results = []
+        for size in range(1, min(3, len(input_tags)) + 1):
+            for subset in combinations(input_tags, size):
+                mask = -1
+                for tag in subset:
+                    mask &= self.tag_masks.get(tag, 0)
+                if TOP_SENIOR_TAG not in subset:
+                    mask &= ~self.top_mask
+                if not mask:
+                    continue
+                # 计算保底星级时忽略1、2星，除非组合只能招募到1、2星干员
+                guaranteed = mask & ~self.low_mask or mask
+                min_rarity = next(r for r in range(6) if guaranteed & self.rarity_masks[r])
+                # 按星级掩码从高到低取出干员，无需排序
+                operators = [op for r in range(5, -1, -1) for op in self._iter_operators(mask & self.rarity_masks[r])]
+                results.append(RecruitResult(subset, min_rarity + 1, operators))
+        results.sort(key=lambda r: (-r.min_rarity, len(r.tags)))
+        return results
 
 
 class GongzhaoModel:
     def __init__(self, config=None):
         # 暂时没有配置项
         self.config = config
+        self.recruitment_data = []  # 可公开招募的干员数据
+        self.last_update_time = 0
+        self.UPDATE_INTERVAL = 86400  # 一天更新一次，公招池很少变化
 
-    async def get_public_recruitment_data(self):
-        """异步获取所有可公开招募的干员数据。"""
-        url = "https://prts.wiki/api.php"
+        # 确保data目录存在
+        self.DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+        self.RECRUITMENT_DATA_FILE = os.path.join(self.DATA_DIR, 'recruitment_data.json')
+        os.makedirs(self.DATA_DIR, exist_ok=True)
+        self.tag_index = None
+        # 后台刷新任务，数据过期时不阻塞查询
+        self._refresh_task = None
+        self._refresh_failures = 0
+        self._next_refresh_time = 0  # 刷新失败后，在此时间之前不再重试
+        self.REFRESH_BACKOFF_BASE = 30  # 失败退避的初始间隔（秒）
+        self.REFRESH_BACKOFF_MAX = 3600
+
+    async def update_recruitment_data(self, force_update=False):
+        """异步获取所有可公开招募的干员数据，并写入本地文件"""
+        current_time = time.time()
+        # 如果不是强制更新，检查是否需要更新数据
+        if not force_update and current_time - self.last_update_time <= self.UPDATE_INTERVAL:
+            return False
         params = {
             "action": "cargoquery",
             "format": "json",
@@ -20,103 +128,136 @@ class GongzhaoModel:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(url, params=params)
-                response.raise_for_status()
-                data = response.json()
-
-                recruitment_data_cache = [item["title"] for item in data.get("cargoquery", [])]
-                return recruitment_data_cache
-
+            # 使用共享的http客户端，复用连接
+            data = await search_model._api_get(params)
+            recruitment_data = [item["title"] for item in data.get("cargoquery", [])]
         except (httpx.HTTPStatusError, httpx.RequestError) as e:
             print(f"数据获取失败，请检查网络连接或API状态。错误: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"公招数据处理失败: {e}")
+            return False
+        if not recruitment_data:
+            return False
+        self.recruitment_data = recruitment_data
+        self.last_update_time = current_time
+        self.tag_index = None  # 数据变化后重建标签索引
+        with open(self.RECRUITMENT_DATA_FILE, 'w', encoding='utf-8') as f:
+            json.dump({
+                'recruitment_data': self.recruitment_data,
+                'last_update_time': self.last_update_time
+            }, f, ensure_ascii=False, indent=2)
+        logger.info(f"已更新公招数据，共 {len(self.recruitment_data)} 个干员")
+        return True
+
+    async def get_public_recruitment_data(self):
+        """获取可公开招募的干员数据，优先使用内存和本地文件中的数据，数据过期时在后台刷新"""
+        if self.recruitment_data:
+            self.schedule_refresh()
+            return self.recruitment_data
+        try:
+            with open(self.RECRUITMENT_DATA_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                self.recruitment_data = data.get('recruitment_data', [])
+                self.last_update_time = data.get('last_update_time', 0)
+                self.tag_index = None
+            if self.recruitment_data:
+                self.schedule_refresh()
+            else:
+                await self.update_recruitment_data(force_update=True)
+        except FileNotFoundError:
+            logger.info("未找到公招数据文件，将创建新文件")
+            await self.update_recruitment_data(force_update=True)
+        except Exception as e:
+            logger.error(f"加载公招数据失败: {e}")
+        return self.recruitment_data or None
+
+    def schedule_refresh(self):
+        """数据过期时启动后台刷新，已有刷新任务或处于失败退避期时跳过"""
+        current_time = time.time()
+        if current_time - self.last_update_time <= self.UPDATE_INTERVAL:
+            return False
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return False
+        if current_time < self._next_refresh_time:
+            return False
+        self._refresh_task = asyncio.create_task(self._background_refresh())
+        return True
+
+    async def _background_refresh(self):
+        """后台刷新公招数据，失败时指数退避"""
+        updated = await self.update_recruitment_data(force_update=True)
+        if updated:
+            self._refresh_failures = 0
+            self._next_refresh_time = 0
+        else:
+            self._refresh_failures += 1
+            delay = min(self.REFRESH_BACKOFF_BASE * 2 ** (self._refresh_failures - 1), self.REFRESH_BACKOFF_MAX)
+            self._next_refresh_time = time.time() + delay
+            logger.info(f"公招数据刷新失败，{delay} 秒后重试")
+        return updated
+
+    def invalidate(self):
+        """干员页面有变化时调用（见recent_changes.py）：在后台重新获取公招数据，查询继续使用当前数据"""
+        self.last_update_time = 0
+        self._next_refresh_time = 0
+        if self.recruitment_data:
+            self.schedule_refresh()
+
+    async def wait_for_refresh(self):
+        """等待正在进行的后台刷新完成（单次运行的程序退出前调用）"""
+        if self._refresh_task is not None and not self._refresh_task.done():
+            await self._refresh_task
+
+    @staticmethod
+    def parse_tags(user_input: str):
+        """按空格或中英文逗号切分标签"""
+        tags = re.split(r'[\s,，]+', user_input)
+        return [tag.strip() for tag in tags if tag.strip()]
+
+    @stats.timed("gongzhao.query")
+    async def query(self, input_tags):
+        """计算公招标签的所有组合，数据获取失败时返回None"""
+        operators_data = await self.get_public_recruitment_data()
+        if operators_data is None:
             return None
+        if self.tag_index is None:
+            with stats.timer("gongzhao.build_index"):
+                self.tag_index = RecruitTagIndex(operators_data)
+        with stats.timer("gongzhao.solve"):
+            return self.tag_index.solve(input_tags)
 
-    async def run(self):
+    async def run(self, user_input=None):
         """主函数，负责用户交互和数据处理。"""
         print("公招查询")
-        user_input = input("请输入公招标签（用逗号分隔，如：治疗，防护）：")
-        tags = re.split(r'[\s,，]+', user_input)
-        input_tags = [tag.strip() for tag in tags if tag.strip()]
+        if user_input is None:
+            user_input = input("请输入公招标签（用逗号分隔，如：治疗，防护）：")
+        input_tags = self.parse_tags(user_input)
 
         if not input_tags:
             print("您没有输入任何标签。")
             return
 
-        operators_data = await self.get_public_recruitment_data()
+        results = await self.query(input_tags)
 
-        if operators_data is None:
+        if results is None:
             return
 
-        matched_operators_all = []
-        matched_operators_single = {tag: [] for tag in input_tags}  # 每个标签下单独匹配的干员
-
-        # 遍历所有干员数据，进行匹配
-        for operator in operators_data:
-            # 获取干员的标签字符串
-            operator_tags_str = operator.get("tag", "")
-
-            # 统计该干员匹配了多少个输入标签
-            matched_tag_count = 0
-            for tag in input_tags:
-                if tag in operator_tags_str:
-                    matched_tag_count += 1
-
-            # 完全匹配：干员同时具有所有输入标签
-            if matched_tag_count == len(input_tags):
-                matched_operators_all.append(operator)
-            # 部分匹配：只匹配部分标签
-            elif matched_tag_count > 0:
-                # 对于每个匹配的标签，将该干员添加到对应的列表中
-                for tag in input_tags:
-                    if tag in operator_tags_str:
-                        matched_operators_single[tag].append(operator)
-
-        # 显示完全匹配的干员
-        if matched_operators_all:
-            print("\n找到以下完全匹配的干员：")
-            for op_all in matched_operators_all:
-                name = op_all.get("cn", "未知干员")
-                rarity = "★" * (int(op_all.get("rarity", 0)) + 1)
-                profession = op_all.get("profession", "未知职业")
-                position = op_all.get("position", "未知位置")
-                tags = op_all.get("tag", "无标签")
-
-                print("-" * 10)
-                print(f"干员: {name}")
-                print(f"星级: {rarity}")
-                print(f"职业: {profession}")
-                print(f"位置: {position}")
-                print(f"标签: {tags}")
-        else:
-            print("\n暂无完全匹配的干员。")
-
-        # 按照输入标签的顺序显示单个标签匹配的干员
-        print("\n找到以下单标签匹配的干员：")
-        for tag in input_tags:
-            operators = matched_operators_single[tag]
-            print(f"\n标签 '{tag}' 匹配的干员：")
-
-            # 从单标签匹配列表中排除那些也出现在完全匹配列表中的干员
-            unique_operators = [op for op in operators if op not in matched_operators_all]
-
-            if not unique_operators:
-                print("无匹配干员")
-                continue
+        unknown_tags = [tag for tag in input_tags if tag not in self.tag_index.tag_masks]
+        if unknown_tags:
+            print(f"未知标签：{'，'.join(unknown_tags)}")
+        if not results:
+            print("\n暂无匹配的干员。")
+            return results
 
-            for op in unique_operators:
-                name = op.get("cn", "未知干员")
-                rarity = "★" * (int(op.get("rarity", 0)) + 1)
-                profession = op.get("profession", "未知职业")
-                position = op.get("position", "未知位置")
-                tags = op.get("tag", "无标签")
-
-                print("-" * 10)
-                print(f"干员: {name}")
-                print(f"星级: {rarity}")
-                print(f"职业: {profession}")
-                print(f"位置: {position}")
-                print(f"标签: {tags}")
+        # 按保底星级从高到低显示各标签组合
+        for result in results:
+            print("-" * 10)
+            print(f"标签组合: {' + '.join(result.tags)}")
+            print(f"保底星级: {'★' * result.min_rarity}")
+            names = [f"{op.get('cn', '未知干员')}({int(op.get('rarity', 0)) + 1}★)" for op in result.operators]
+            print(f"干员: {'，'.join(names)}")
+        return results
 
 # 延迟初始化
 gongzhao_model_instance = None
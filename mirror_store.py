@@ -0,0 +1,138 @@
+import sqlite3, zlib, logging
+
+logger = logging.getLogger(__name__)
+
+# 压缩级别，页面正文以zlib压缩存储
+COMPRESS_LEVEL = 6
+
+
+class MirrorStore:
+    """镜像的本地存储（SQLite）：页面正文（zlib压缩）、重定向、图片链接和同步状态"""
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_file)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS page (title TEXT PRIMARY KEY, revid INTEGER, content BLOB);
+                CREATE TABLE IF NOT EXISTS redirect (title TEXT PRIMARY KEY, target TEXT);
+                CREATE TABLE IF NOT EXISTS image (name TEXT PRIMARY KEY, url TEXT);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def resolve(self, title: str):
+        """跟随重定向，返回最终标题"""
+        try:
+            row = self._connect().execute("SELECT target FROM redirect WHERE title = ?", (title,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"查询镜像失败: {e}")
+            return title
+        return row[0] if row else title
+
+    def get_page(self, title: str):
+        """返回(最终标题, 修订版本号, wikitext)，页面不在镜像中时返回None"""
+        final = self.resolve(title)
+        try:
+            row = self._connect().execute("SELECT revid, content FROM page WHERE title = ?", (final,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"查询镜像失败: {e}")
+            return None
+        if row is None:
+            return None
+        return final, row[0], zlib.decompress(row[1]).decode('utf-8')
+
+    def revision_id(self, title: str):
+        """返回页面的修订版本号（跟随重定向），不解压正文"""
+        try:
+            row = self._connect().execute("SELECT revid FROM page WHERE title = ?", (self.resolve(title),)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"查询镜像失败: {e}")
+            return None
+        return row[0] if row else None
+
+    def revision_ids(self):
+        """返回 标题→修订版本号"""
+        try:
+            return dict(self._connect().execute("SELECT title, revid FROM page").fetchall())
+        except sqlite3.Error as e:
+            logger.error(f"查询镜像失败: {e}")
+            return {}
+
+    def titles(self):
+        """返回全部页面标题和重定向标题，用于离线搜索"""
+        try:
+            conn = self._connect()
+            pages = [row[0] for row in conn.execute("SELECT title FROM page ORDER BY title")]
+            redirects = conn.execute("SELECT title, target FROM redirect ORDER BY title").fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"查询镜像失败: {e}")
+            return [], []
+        return pages, redirects
+
+    def put_pages(self, pages: list):
+        """写入页面，pages为(标题, 修订版本号, wikitext)的列表"""
+        rows = [(title, revid, zlib.compress(wikitext.encode('utf-8'), COMPRESS_LEVEL))
+                for title, revid, wikitext in pages]
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO page VALUES (?, ?, ?)", rows)
+        return len(rows)
+
+    def delete_pages(self, titles: list):
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM page WHERE title = ?", [(title,) for title in titles])
+            conn.executemany("DELETE FROM redirect WHERE target = ?", [(title,) for title in titles])
+
+    def replace_redirects(self, redirects: dict):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM redirect")
+            conn.executemany("INSERT OR REPLACE INTO redirect VALUES (?, ?)", redirects.items())
+
+    def get_image_url(self, name: str):
+        try:
+            row = self._connect().execute("SELECT url FROM image WHERE name = ?", (name,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"查询镜像失败: {e}")
+            return None
+        return row[0] if row else None
+
+    def replace_images(self, images: dict):
+        """用新数据整体替换图片链接，images为 文件名→url"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM image")
+            conn.executemany("INSERT OR REPLACE INTO image VALUES (?, ?)", images.items())
+
+    def image_count(self):
+        try:
+            return self._connect().execute("SELECT COUNT(*) FROM image").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"查询镜像失败: {e}")
+            return 0
+
+    def count(self):
+        try:
+            return self._connect().execute("SELECT COUNT(*) FROM page").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"查询镜像失败: {e}")
+            return 0
+
+    def get_meta(self, key: str, default=None):
+        try:
+            row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"查询镜像失败: {e}")
+            return default
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
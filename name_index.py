@@ -0,0 +1,73 @@
+import re
+
+# 名称规范化：去除中文、字母、数字、下划线以外的字符
+NORMALIZE_PATTERN = re.compile(r'[^\u4e00-\u9fff\w]')
+
+
+def normalize_name(name: str):
+    """规范化名称，用于忽略空格、标点等差异的匹配"""
+    return NORMALIZE_PATTERN.sub('', name)
+
+
+class NameIndex:
+    """
+    名称索引：规范化名称→标准名称
+    先精确匹配，未命中时选取包含输入的最短名称
+    包含匹配通过单字和二元组(bigram)倒排索引缩小候选范围，无需遍历全部名称
+    """
+
+    def __init__(self, pairs=()):
+        self._exact = {}
+        self._grams = {}  # 单字/二元组→包含它的规范化名称集合
+        self._order = {}  # 规范化名称→加入顺序，长度相同时取先加入的
+        for key, value in pairs:
+            self.add(key, value)
+
+    def add(self, key: str, value: str):
+        normalized = normalize_name(key)
+        # 同一规范化名称保留第一次出现的标准名称
+        if normalized and normalized not in self._exact:
+            self._exact[normalized] = value
+            self._order[normalized] = len(self._order)
+            for gram in self._iter_grams(normalized):
+                self._grams.setdefault(gram, set()).add(normalized)
+
+    @staticmethod
+    def _iter_grams(text: str):
+        yield from text
+        for i in range(len(text) - 1):
+            yield text[i:i + 2]
+
+    def _candidates(self, normalized: str):
+        """返回可能包含输入的名称集合"""
+        if len(normalized) == 1:
+            return self._grams.get(normalized, set())
+        sets = []
+        for i in range(len(normalized) - 1):
+            keys = self._grams.get(normalized[i:i + 2])
+            if not keys:
+                return set()
+            sets.append(keys)
+        sets.sort(key=len)
+        return set.intersection(*sets)
+
+    def __len__(self):
+        return len(self._exact)
+
+    def __contains__(self, name: str):
+        return normalize_name(name) in self._exact
+
+    def lookup(self, name: str):
+        """查找名称，返回(标准名称, 是否精确匹配)，未找到返回(None, False)"""
+        normalized = normalize_name(name)
+        if not normalized:
+            return None, False
+        value = self._exact.get(normalized)
+        if value is not None:
+            return value, True
+        # 若未找到精确匹配，则选取包含该字段的最短项
+        matching_keys = [key for key in self._candidates(normalized) if normalized in key]
+        if not matching_keys:
+            return None, False
+        best_key = min(matching_keys, key=lambda key: (len(key), self._order[key]))
+        return self._exact[best_key], False
@@ -0,0 +1,145 @@
+import os, json, time, asyncio, logging, httpx
+from name_index import NameIndex
+from search_model import search_model
+
+logger = logging.getLogger(__name__)
+
+
+class OperatorIndex:
+    """干员名称索引，数据来自cargo的chara表，持久化到data/operator_index.json"""
+
+    def __init__(self):
+        self.titles = {}  # 干员名→页面标题
+        self.index = NameIndex()
+        self.last_update_time = 0
+        self.UPDATE_INTERVAL = 86400  # 一天更新一次
+
+        self.DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+        self.INDEX_FILE = os.path.join(self.DATA_DIR, 'operator_index.json')
+        os.makedirs(self.DATA_DIR, exist_ok=True)
+        self._loaded = False
+        self._refresh_task = None
+        self._refresh_failures = 0
+        self._next_refresh_time = 0  # 更新失败后，在此时间之前不再重试
+        self.REFRESH_BACKOFF_BASE = 30  # 失败退避的初始间隔（秒）
+        self.REFRESH_BACKOFF_MAX = 3600
+
+    def _rebuild(self):
+        self.index = NameIndex(self.titles.items())
+
+    async def update(self, force_update=False):
+        """从cargo的chara表拉取全部干员，失败时指数退避，退避期内（非强制更新时）不再请求"""
+        current_time = time.time()
+        if not force_update and (current_time - self.last_update_time <= self.UPDATE_INTERVAL
+                                 or current_time < self._next_refresh_time):
+            return False
+        if search_model.offline:
+            return False
+        titles = await self._fetch_titles()
+        if not titles:
+            self._refresh_failures += 1
+            delay = min(self.REFRESH_BACKOFF_BASE * 2 ** (self._refresh_failures - 1), self.REFRESH_BACKOFF_MAX)
+            self._next_refresh_time = time.time() + delay
+            logger.info(f"干员索引更新失败，{delay} 秒后重试")
+            return False
+        self._refresh_failures = 0
+        self._next_refresh_time = 0
+        self.titles = titles
+        self.last_update_time = current_time
+        self._rebuild()
+        with open(self.INDEX_FILE, 'w', encoding='utf-8') as f:
+            json.dump({
+                'titles': self.titles,
+                'last_update_time': self.last_update_time
+            }, f, ensure_ascii=False, indent=2)
+        logger.info(f"已更新干员索引，共 {len(self.titles)} 个干员")
+        return True
+
+    async def _fetch_titles(self):
+        """请求chara表，返回 干员名→页面标题，失败时返回None"""
+        params = {
+            "action": "cargoquery",
+            "format": "json",
+            "tables": "chara",
+            "limit": "5000",
+            "fields": "chara._pageName=page,chara.cn"
+        }
+        try:
+            data = await search_model._api_get(params)
+            titles = {}
+            for item in data.get("cargoquery", []):
+                row = item["title"]
+                page = row.get("page")
+                if not page:
+                    continue
+                titles[row.get("cn") or page] = page
+                titles.setdefault(page, page)
+        except (httpx.HTTPStatusError, httpx.RequestError, KeyError) as e:
+            logger.error(f"更新干员索引失败: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"干员索引处理失败: {e}")
+            return None
+        return titles
+
+    async def load(self):
+        """加载本地索引；不存在时等待下载，过期时在后台更新"""
+        try:
+            with open(self.INDEX_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                self.titles = data.get('titles', {})
+                self.last_update_time = data.get('last_update_time', 0)
+            self._rebuild()
+            self.schedule_refresh()
+        except FileNotFoundError:
+            logger.info("未找到干员索引文件，将创建新文件")
+            await self.update(force_update=True)
+        except Exception as e:
+            logger.error(f"加载干员索引失败: {e}")
+        self._loaded = True
+
+    def schedule_refresh(self):
+        """索引过期时启动后台更新，查找继续使用当前索引；已有更新任务或处于失败退避期时跳过"""
+        current_time = time.time()
+        if search_model.offline or current_time - self.last_update_time <= self.UPDATE_INTERVAL:
+            return False
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return False
+        if current_time < self._next_refresh_time:
+            return False
+        self._refresh_task = asyncio.create_task(self.update(force_update=True))
+        return True
+
+    async def wait_for_refresh(self):
+        """等待正在进行的后台更新完成（单次运行的程序退出前调用）"""
+        if self._refresh_task is not None and not self._refresh_task.done():
+            await self._refresh_task
+
+    def invalidate_titles(self, titles):
+        """
+        页面有变化时调用（见recent_changes.py）：干员页面有变化时在后台重新拉取索引，查找继续使用当前索引；
+        新建的干员页面在索引下次定期更新时加入；返回是否涉及干员页面
+        """
+        operator_changed = not set(self.titles.values()).isdisjoint(titles)
+        if operator_changed:
+            self.last_update_time = 0
+            self._next_refresh_time = 0
+            if self._loaded:
+                self.schedule_refresh()
+        return operator_changed
+
+    async def lookup(self, name: str):
+        """查找干员页面标题，未找到返回None"""
+        if not self._loaded:
+            await self.load()
+        else:
+            # 常驻运行时索引过期（或被标记为需要更新）后在后台重新拉取
+            self.schedule_refresh()
+        title, exact = self.index.lookup(name)
+        if title and not exact:
+            print(f"未找到精确匹配项，使用包含该字段的最短项: {title}")
+        return title
+
+
+# 创建全局实例
+operator_index = OperatorIndex()
@@ -1,17 +1,18 @@
-import re
 from collections import namedtuple
 from search_model import search_model
+from stats import stats
+from wikitext_parser import parse_page
 
 OtherthingInfo = namedtuple('OtherthingInfo',
                           ['image_url', 'other_thing_name', 'describe', 'yong_tu', 'get_manner', 'fen_lei'])
 
-# 预编译字段正则表达式
-FIELD_PATTERNS_OTHER = [
-    ('describe', re.compile(r"\|描述\s*=\s*(.+)"), lambda x: x.strip()),
-    ('yong_tu', re.compile(r"\|用途\s*=\s*(.+)"), lambda x: x.strip()),
-    ('get_manner', re.compile(r"\|获得方式\s*=\s*(.+)"), lambda x: x.strip()),
-    ('fen_lei', re.compile(r"\|分类\s*=\s*(.+)"), lambda x: x.strip())
-]
+# 道具页面中各字段的模板参数名
+FIELD_KEYS_OTHER = {
+    'describe': '描述',
+    'yong_tu': '用途',
+    'get_manner': '获得方式',
+    'fen_lei': '分类',
+}
 
 
 class OtherThing:
@@ -26,23 +27,28 @@ class OtherThing:
         name = f"文件:道具 带框 {name}.png"
         return await search_model.get_images_url([name])
 
+    @staticmethod
+    def parse_fields(page):
+        """从道具页面（PageTemplates）中读取各字段，字段不存在或为空时为None"""
+        return {field_name: page.param(key) or None for field_name, key in FIELD_KEYS_OTHER.items()}
+
+    @stats.timed("other_thing.query")
     async def clean_over_wiki(self, other_thing_name):
-        other_thing_name = await search_model.search_wikitext(other_thing_name)
-        other_thing_name, wikitext = await search_model.get_wikitext(other_thing_name)
+        title = await search_model.search_wikitext(other_thing_name)
+        if not title:
+            return None
+        other_thing_name, wikitext = await search_model.get_wikitext(title)
+        # 缓存项以请求的标题为键，版本号在获取图片前取得，与wikitext对应
+        revid = search_model.cached_revision_id(title)
         if self.image_output:
             image_url = await self.get_other_image(other_thing_name)
         else:
             image_url = []
         if not wikitext:
             return None
-        # 批量处理正则表达式查找和结果处理
-        results = {}
-        for field_name, pattern, process_func in FIELD_PATTERNS_OTHER:
-            match = pattern.search(wikitext)
-            if match:
-                results[field_name] = process_func(match.group(1))
-            else:
-                results[field_name] = None
+        page = parse_page(wikitext, other_thing_name, revid)
+        with stats.timer("other_thing.parse"):
+            results = self.parse_fields(page)
 
         return OtherthingInfo(image_url, other_thing_name, results['describe'], results['yong_tu'],
                             results['get_manner'], results['fen_lei'])
@@ -0,0 +1,47 @@
+import asyncio, time
+
+
+class TokenBucket:
+    """
+    令牌桶限流：每秒补充rate个令牌，最多积累burst个，每次请求消耗一个
+    自适应：服务器返回429/503等时降低速率，请求成功后逐步恢复到设定值
+    """
+
+    def __init__(self, rate=5.0, burst=10, min_rate=0.5):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min(min_rate, rate)
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def configure(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min(self.min_rate, rate)
+        self.tokens = min(self.tokens, burst)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """获取一个令牌，令牌不足时等待；加锁保证等待的请求按顺序获得令牌"""
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def penalize(self):
+        """被服务器限流时速率减半"""
+        self.rate = max(self.min_rate, self.rate / 2)
+
+    def reward(self):
+        """请求成功时缓慢恢复速率"""
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
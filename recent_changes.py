@@ -0,0 +1,223 @@
+import os, sys, json, time, asyncio, logging, httpx
+from collections import namedtuple
+from search_model import search_model
+from stats import stats
+import wikitext_parser
+
+logger = logging.getLogger(__name__)
+
+"""
+增量同步：轮询list=recentchanges，找出上次轮询之后被编辑、新建、删除或移动的页面，
+只让这些页面的缓存和派生数据（敌人数据、干员索引、关卡缓存、本地镜像等）失效或重新获取，
+每次轮询只需几KB，无需定时重新下载整页
+"""
+
+ChangeSet = namedtuple('ChangeSet', ['changed', 'removed', 'created'])
+"""
+"changed": 被编辑、新建或移入的页面 标题→最新修订版本号（移入的页面为None）
+"removed": 被删除或移走的页面标题集合
+"created": 新建的页面标题集合
+"""
+
+# MediaWiki的recentchanges只保留一段时间（默认90天），超过该时间未轮询时无法增量同步
+MAX_GAP = 30 * 86400
+# 关注的变更类型和名字空间（主名字空间）
+CHANGE_TYPES = "edit|new|log"
+CHANGE_NAMESPACE = "0"
+
+
+def utc_timestamp(t=None):
+    """MediaWiki API使用的时间格式，如 2025-01-01T00:00:00Z"""
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(t))
+
+
+class RecentChanges:
+    def __init__(self, config=None):
+        self.config = config
+        sync_config = (config or {}).get("sync", {})
+        self.interval = sync_config.get("interval", 300)  # 常驻服务中的轮询间隔（秒）
+        self.last_timestamp = None  # 已处理到的最后一条变更的时间（服务器时间）
+        self.last_rcid = 0  # 已处理到的最后一条变更的rcid，rcstart包含起点，用于去重
+        self.since = None  # 从此（本地）时间起的页面变化都已处理
+        self.last_poll_time = 0
+
+        self.DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+        self.STATE_FILE = os.path.join(self.DATA_DIR, 'recent_changes.json')
+        os.makedirs(self.DATA_DIR, exist_ok=True)
+        self._loaded = False
+        self._task = None
+
+    def load(self):
+        try:
+            with open(self.STATE_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.last_timestamp = data.get('last_timestamp')
+            self.last_rcid = data.get('last_rcid', 0)
+            self.since = data.get('since')
+            self.last_poll_time = data.get('last_poll_time', 0)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"加载增量同步状态失败: {e}")
+        self._loaded = True
+
+    def save(self):
+        with open(self.STATE_FILE, 'w', encoding='utf-8') as f:
+            json.dump({
+                'last_timestamp': self.last_timestamp,
+                'last_rcid': self.last_rcid,
+                'since': self.since,
+                'last_poll_time': self.last_poll_time
+            }, f, ensure_ascii=False, indent=2)
+
+    def has_baseline(self):
+        """是否可以增量同步：已有起点，且距上次轮询未超过recentchanges的保留时间"""
+        if not self._loaded:
+            self.load()
+        return self.last_timestamp is not None and time.time() - self.last_poll_time <= MAX_GAP
+
+    async def reset_baseline(self):
+        """以最新一条变更为起点（完整刷新之前调用），之后的变化由poll处理"""
+        now = time.time()
+        data = await search_model._api_get({
+            "action": "query", "list": "recentchanges", "rcprop": "timestamp|ids",
+            "rclimit": "1", "format": "json"})
+        latest = data["query"]["recentchanges"]
+        if latest:
+            self.last_timestamp, self.last_rcid = latest[0]["timestamp"], latest[0]["rcid"]
+        else:
+            self.last_timestamp, self.last_rcid = utc_timestamp(now), 0
+        self.since = now
+        self.last_poll_time = now
+        self._loaded = True
+        self.save()
+
+    async def fetch_changes(self):
+        """返回上次轮询之后的全部变更（按时间先后），跟随续传"""
+        params = {
+            "action": "query",
+            "list": "recentchanges",
+            "rcstart": self.last_timestamp,
+            "rcdir": "newer",
+            "rcnamespace": CHANGE_NAMESPACE,
+            "rctype": CHANGE_TYPES,
+            "rcprop": "title|ids|timestamp|loginfo",
+            "rclimit": "max",
+            "format": "json"
+        }
+        entries = []
+        while True:
+            data = await search_model._api_get(params)
+            entries.extend(data["query"]["recentchanges"])
+            if "continue" not in data:
+                break
+            params = {**params, **data["continue"]}
+        return [entry for entry in entries if entry["rcid"] > self.last_rcid]
+
+    @staticmethod
+    def collect(entries):
+        """将变更记录合并为ChangeSet，同一页面以最后一条记录为准"""
+        changed, removed, created = {}, set(), set()
+        for entry in entries:
+            title = entry["title"]
+            if entry["type"] in ("edit", "new"):
+                changed[title] = entry.get("revid")
+                removed.discard(title)
+                if entry["type"] == "new":
+                    created.add(title)
+            elif entry.get("logtype") == "delete" and entry.get("logaction") == "delete":
+                changed.pop(title, None)
+                removed.add(title)
+            elif entry.get("logtype") == "move":
+                changed.pop(title, None)
+                removed.add(title)
+                target = entry.get("logparams", {}).get("target_title")
+                if target:
+                    changed[target] = None
+                    removed.discard(target)
+            elif entry.get("logtype") == "delete" and entry.get("logaction") == "restore":
+                changed[title] = None
+                removed.discard(title)
+        return ChangeSet(changed, removed, created)
+
+    @stats.timed("recent_changes.poll")
+    async def poll(self):
+        """
+        返回上次轮询之后的页面变化（ChangeSet）
+        没有起点或间隔过久时以当前为起点并返回None，调用方应完整刷新
+        """
+        if not self.has_baseline():
+            await self.reset_baseline()
+            return None
+        now = time.time()
+        entries = await self.fetch_changes()
+        if entries:
+            self.last_timestamp, self.last_rcid = entries[-1]["timestamp"], entries[-1]["rcid"]
+        self.last_poll_time = now
+        self.save()
+        return self.collect(entries)
+
+    async def apply(self, changes: ChangeSet):
+        """让变化页面的缓存和派生数据失效，已加载的功能模块才需要处理；返回本地镜像的更新数量"""
+        titles = set(changes.changed) | changes.removed
+        search_model.invalidate_titles(titles)
+        wikitext_parser.invalidate(titles)
+        # 本次轮询之前的变化均已处理，未失效的缓存项无需再校验版本号
+        search_model.mark_changes_checked(self.since, self.last_poll_time, max(self.interval * 2, 60))
+        result = {"changed": len(changes.changed), "removed": len(changes.removed)}
+        if not titles:
+            return result
+
+        stage_enemy_module = sys.modules.get("stage_enemy")
+        if stage_enemy_module is not None and stage_enemy_module.stage_enemy_instance is not None:
+            stage_enemy_module.stage_enemy_instance.invalidate_titles(titles)
+        operator_index_module = sys.modules.get("operator_index")
+        if operator_index_module is not None:
+            operator_changed = operator_index_module.operator_index.invalidate_titles(titles)
+            # 干员页面变化可能影响公招标签，在后台重新获取
+            gongzhao_module = sys.modules.get("gongzhao_model")
+            if operator_changed and gongzhao_module is not None and gongzhao_module.gongzhao_model_instance:
+                gongzhao_module.gongzhao_model_instance.invalidate()
+        if search_model.mirror is not None:
+            import wiki_mirror
+            result.update(await wiki_mirror.initialize_wiki_mirror(self.config).apply_changes(changes))
+        logger.info(f"已处理 {len(titles)} 个页面的变化")
+        return result
+
+    async def sync_once(self):
+        """轮询一次并处理变化，返回处理结果；需要完整刷新或请求失败时返回None"""
+        try:
+            changes = await self.poll()
+            if changes is None:
+                return None
+            return await self.apply(changes)
+        except (httpx.HTTPStatusError, httpx.RequestError, KeyError) as e:
+            logger.error(f"增量同步失败: {e}")
+            return None
+
+    async def run_forever(self):
+        """常驻服务中定时轮询"""
+        while True:
+            await self.sync_once()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """在后台启动定时轮询，interval为0时不启动"""
+        if self.interval and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self.run_forever())
+        return self._task
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+# 延迟初始化
+recent_changes_instance = None
+
+def initialize_recent_changes(config):
+    global recent_changes_instance
+    if recent_changes_instance is None:
+        recent_changes_instance = RecentChanges(config)
+    return recent_changes_instance
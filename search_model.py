@@ -1,21 +1,234 @@
-import httpx, re, logging
+import httpx, logging, os, time, asyncio, hashlib, random
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote
+from collections import OrderedDict
+from wiki_cache import WikitextCache
+from rate_limit import TokenBucket
+from stats import stats
+from name_index import normalize_name, NameIndex
+
+API_URL = "https://prts.wiki/api.php"
+# MediaWiki单次请求titles参数最多50个
+MAX_TITLES_PER_REQUEST = 50
+# 图片文件的存储地址
+IMAGE_BASE_URL = "https://media.prts.wiki"
+# MediaWiki生成链接时不编码的字符（wfUrlencode），如 阿米娅(近卫) 中的括号
+URL_SAFE_CHARS = ";:@$!*(),/~"
+FILE_NAMESPACE_PREFIXES = ("文件:", "File:", "Image:", "图像:")
+# 需要重试的HTTP状态码
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# 本地镜像的默认位置
+MIRROR_FILE = os.path.join(os.path.dirname(__file__), 'data', 'wiki_mirror.db')
 
-# 配置日志
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
 class SearchModel:
     def __init__(self):
-        # 创建全局的httpx客户端，用于连接池和复用连接
-        self.http_client = httpx.AsyncClient(
+        # 全局的httpx客户端，用于连接池和复用连接；首次请求时才创建（创建SSL上下文较慢）
+        self._http_client = None
+        self._transport = None
+        # wikitext缓存，按标题和修订版本号存储
+        self.wikitext_cache = WikitextCache(
+            os.path.join(os.path.dirname(__file__), 'data', 'wikitext_cache'))
+        # 在此时间内（秒）直接使用缓存，不校验版本号
+        self.REVALIDATE_INTERVAL = 60
+        # 增量同步（见recent_changes.py）已处理从changes_since起的全部页面变化，最近一次轮询在changes_checked_time，
+        # 在此之后校验过的缓存项只要未被失效，在changes_valid_for秒内无需再校验版本号
+        self.changes_since = None
+        self.changes_checked_time = 0
+        self.changes_valid_for = 0
+        # 图片链接缓存，图片标题→url
+        self.image_url_cache = OrderedDict()
+        self.IMAGE_CACHE_SIZE = 2048
+        # 是否在本地计算图片链接，以及是否在后台通过API校验
+        self.offline_image_url = False
+        self.verify_image_url = False
+        self._background_tasks = set()
+        # 正在进行的请求，请求参数→Task
+        self._in_flight = {}
+        # 限流与重试设置，可在config.yaml的api项中修改
+        self.rate_limiter = TokenBucket(rate=5.0, burst=10)
+        self.max_retries = 3
+        self.backoff_base = 0.5
+        self.backoff_max = 30.0
+        self.maxlag = 5  # 数据库复制延迟超过该秒数时服务器会拒绝请求，0表示不使用
+        # 本地镜像（见wiki_mirror.py）；offline为True时只从镜像读取，不请求API
+        self.mirror = None
+        self.offline = False
+        self._mirror_index = None  # 镜像页面标题的名称索引，用于离线搜索
+
+    @staticmethod
+    def _create_http_client(transport=None):
+        return httpx.AsyncClient(
             timeout=httpx.Timeout(30.0),
-            limits=httpx.Limits(max_keepalive_connections=10, max_connections=50)
+            limits=httpx.Limits(max_keepalive_connections=10, max_connections=50),
+            transport=transport
         )
 
+    @property
+    def http_client(self):
+        if self._http_client is None:
+            self._http_client = self._create_http_client(self._transport)
+        return self._http_client
+
+    def set_transport(self, transport):
+        """替换HTTP传输层（如httpx.MockTransport），用于离线回放和基准测试"""
+        self._transport = transport
+        self._http_client = None
+
+    def configure(self, config):
+        """根据config.yaml设置运行参数"""
+        image_config = (config or {}).get("image", {})
+        self.offline_image_url = image_config.get("offline_url", False)
+        self.verify_image_url = image_config.get("verify_offline_url", True)
+        api_config = (config or {}).get("api", {})
+        self.rate_limiter.configure(api_config.get("rate", 5.0), api_config.get("burst", 10))
+        self.max_retries = api_config.get("max_retries", 3)
+        self.backoff_base = api_config.get("backoff_base", 0.5)
+        self.backoff_max = api_config.get("backoff_max", 30.0)
+        self.maxlag = api_config.get("maxlag", 5)
+        mirror_config = (config or {}).get("mirror", {})
+        self.offline = mirror_config.get("offline", False)
+        # 镜像文件已存在时，在线模式下也用于请求失败时的回退
+        if self.offline or os.path.exists(self._mirror_file(mirror_config)):
+            self.open_mirror(mirror_config)
+
+    @staticmethod
+    def _mirror_file(mirror_config):
+        """镜像文件路径，相对路径以项目目录为准"""
+        db_file = (mirror_config or {}).get("file") or MIRROR_FILE
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), db_file)
+
+    def open_mirror(self, mirror_config=None):
+        """打开本地镜像（sqlite3在此时才导入），返回MirrorStore"""
+        if self.mirror is None:
+            from mirror_store import MirrorStore
+            db_file = self._mirror_file(mirror_config)
+            os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+            self.mirror = MirrorStore(db_file)
+        return self.mirror
+
+    def reset_mirror_index(self):
+        """镜像内容变化后调用，下次离线搜索时重建名称索引"""
+        self._mirror_index = None
+
+    def _mirror_pages(self, titles: list):
+        """从镜像读取页面，返回 请求标题→(最终标题, wikitext)，镜像中没有的页面wikitext为None"""
+        results = {}
+        for title in titles:
+            page = self.mirror.get_page(title)
+            results[title] = (page[0], page[2]) if page is not None else (title, None)
+            stats.cache("mirror", page is not None)
+        return results
+
+    def _backoff_delay(self, attempt: int, response=None):
+        """计算重试等待时间：优先使用Retry-After，否则为带随机抖动的指数退避"""
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(self.backoff_max, max(0.0, float(retry_after)))
+            except ValueError:
+                try:
+                    retry_time = parsedate_to_datetime(retry_after).timestamp()
+                    return min(self.backoff_max, max(0.0, retry_time - time.time()))
+                except (TypeError, ValueError):
+                    pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def _api_phase(params: dict):
+        """根据请求参数得到统计用的阶段名，如 api.search、api.wikitext、api.imageinfo"""
+        action = params.get("action")
+        if action != "query":
+            return f"api.{action}"
+        if params.get("list"):
+            return f"api.{params['list']}"
+        if params.get("prop") == "revisions":
+            return "api.wikitext" if "content" in params.get("rvprop", "") else "api.revision_ids"
+        return f"api.{params.get('prop')}"
+
+    async def _request_json(self, params: dict):
+        """限流后发送请求，遇到429/5xx、maxlag或网络错误时退避重试"""
+        phase = self._api_phase(params)
+        if self.maxlag:
+            params = {**params, "maxlag": self.maxlag}
+        for attempt in range(self.max_retries + 1):
+            wait_start = time.perf_counter()
+            await self.rate_limiter.acquire()
+            start = time.perf_counter()
+            stats.record("api.rate_limit_wait", start - wait_start)
+            try:
+                response = await self.http_client.get(API_URL, params=params)
+            except httpx.TransportError as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.info(f"请求失败，{delay:.1f} 秒后重试: {e}")
+                stats.record("api.retry_wait", delay)
+                await asyncio.sleep(delay)
+                continue
+            if response.status_code in RETRY_STATUS_CODES:
+                self.rate_limiter.penalize()
+                if attempt >= self.max_retries:
+                    response.raise_for_status()
+                delay = self._backoff_delay(attempt, response)
+                logger.info(f"服务器返回 {response.status_code}，{delay:.1f} 秒后重试")
+                stats.record("api.retry_wait", delay)
+                await asyncio.sleep(delay)
+                continue
+            response.raise_for_status()
+            data = response.json()
+            # 服务器复制延迟过大时返回maxlag错误
+            if isinstance(data, dict) and data.get("error", {}).get("code") == "maxlag":
+                self.rate_limiter.penalize()
+                if attempt >= self.max_retries:
+                    raise httpx.HTTPStatusError(f"maxlag: {data['error'].get('info')}",
+                                                request=response.request, response=response)
+                delay = self._backoff_delay(attempt, response)
+                logger.info(f"服务器延迟过大，{delay:.1f} 秒后重试")
+                stats.record("api.retry_wait", delay)
+                await asyncio.sleep(delay)
+                continue
+            self.rate_limiter.reward()
+            stats.record(phase, time.perf_counter() - start, len(response.content))
+            return data
+
+    async def _api_get(self, params: dict):
+        """
+        向Media API发送GET请求并返回解析后的json
+        参数相同的并发请求合并为一次（single-flight），所有调用方共享同一结果，调用方不应修改返回的数据
+        """
+        if self.offline:
+            # 离线模式下不请求API，调用方按网络错误处理（如继续使用本地数据）
+            raise httpx.RequestError(f"离线模式，未请求API: {self._api_phase(params)}")
+        key = tuple(sorted((name, str(value)) for name, value in params.items()))
+        task = self._in_flight.get(key)
+        stats.cache("single_flight", task is not None)
+        if task is None:
+            task = asyncio.ensure_future(self._request_json(params))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # shield：某个调用方被取消时不影响其他等待同一请求的调用方
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _resolve_titles(query_data: dict, titles: list):
+        """根据API返回的normalized和redirects信息，得到 请求标题→最终标题 的映射"""
+        normalized = {item["from"]: item["to"] for item in query_data.get("normalized", [])}
+        redirects = {item["from"]: item["to"] for item in query_data.get("redirects", [])}
+        resolved = {}
+        for title in titles:
+            final = normalized.get(title, title)
+            final = redirects.get(final, final)
+            resolved[title] = final
+        return resolved
+
+    @stats.timed("search_model.search_wikitext")
     async def search_wikitext(self, name: str):
         """异步获取页面的wikitext内容"""
-        url = "https://prts.wiki/api.php"
+        if self.offline:
+            return self._search_mirror(name)
         params1 = {
             "action": "query",
             "list": "search",
@@ -23,9 +236,7 @@ class SearchModel:
             "format": "json"
         }
         try:
-            search_result = await self.http_client.get(url, params=params1)
-            search_result.raise_for_status()
-            search_data = search_result.json()["query"]["search"]
+            search_data = (await self._api_get(params1))["query"]["search"]
             search_data = [item["title"] for item in search_data]
         except (httpx.HTTPStatusError, httpx.RequestError, KeyError) as e:
             logger.error(f"搜索请求失败: {e}")
@@ -40,8 +251,8 @@ class SearchModel:
         输入：破茧之梦
         匹配："破茧之梦"
         """
-        search_filtered = [re.sub(r'[^\u4e00-\u9fff\w]', '', item) for item in search_data]
-        name_filtered = re.sub(r'[^\u4e00-\u9fff\w]', '', name)
+        search_filtered = [normalize_name(item) for item in search_data]
+        name_filtered = normalize_name(name)
         # 使用enumerate避免重复查找索引
         for i, r in enumerate(search_filtered):
             if r == name_filtered:
@@ -58,81 +269,354 @@ class SearchModel:
             print(f"未找到精确匹配项，使用包含该字段的最短项: {shortest_item}")
             return shortest_item
 
-    async def get_wikitext(self, name: str):
-        url = "https://prts.wiki/api.php"
-        params2 = {
+    def _search_mirror(self, name: str):
+        """离线搜索：在镜像的页面标题和重定向中查找，匹配规则与在线搜索相同"""
+        if self._mirror_index is None:
+            with stats.timer("search_model.build_mirror_index"):
+                pages, redirects = self.mirror.titles()
+                # 页面标题优先于重定向，同名时保留页面
+                self._mirror_index = NameIndex([(title, title) for title in pages] + redirects)
+        title, exact = self._mirror_index.lookup(name)
+        if title and not exact:
+            print(f"未找到精确匹配项，使用包含该字段的最短项: {title}")
+        return title
+
+    @staticmethod
+    def _split_titles(titles: list):
+        """按每次请求的标题数量上限切分"""
+        return [titles[i:i + MAX_TITLES_PER_REQUEST] for i in range(0, len(titles), MAX_TITLES_PER_REQUEST)]
+
+    async def _fetch_revision_ids_chunk(self, chunk: list):
+        params = {
+            "action": "query",
+            "prop": "revisions",
+            "titles": "|".join(chunk),
+            "rvprop": "ids",
+            "format": "json",
+            "redirects": "1"
+        }
+        query_data = (await self._api_get(params))["query"]
+        page_revids = {}
+        for page_data in query_data.get("pages", {}).values():
+            if page_data.get("revisions"):
+                page_revids[page_data["title"]] = page_data["revisions"][0]["revid"]
+        return {title: page_revids[final]
+                for title, final in self._resolve_titles(query_data, chunk).items() if final in page_revids}
+
+    def cached_revision_id(self, title: str):
+        """返回缓存中页面的修订版本号，用于按(标题, 版本号)缓存解析结果；未缓存时返回None"""
+        if self.offline:
+            return self.mirror.revision_id(title)
+        entry = self.wikitext_cache.get(title)
+        return entry["revid"] if entry is not None else None
+
+    def is_known_title(self, name: str):
+        """判断是否为已缓存过的页面标题，已知标题可跳过搜索请求"""
+        if self.offline:
+            return self.mirror.resolve(name) == name and self.mirror.revision_id(name) is not None
+        entry = self.wikitext_cache.get(name)
+        return entry is not None and entry["name_out"] == name
+
+    @stats.timed("search_model.get_revision_ids")
+    async def get_revision_ids(self, titles: list):
+        """
+        批量获取页面当前的修订版本号，仅请求rvprop=ids，不下载正文
+        返回 请求标题→revid 的字典（页面不存在时不包含该标题），请求失败返回None
+        """
+        if self.offline:
+            revids = {title: self.mirror.revision_id(title) for title in titles}
+            return {title: revid for title, revid in revids.items() if revid is not None}
+        try:
+            chunk_results = await asyncio.gather(
+                *(self._fetch_revision_ids_chunk(chunk) for chunk in self._split_titles(titles)))
+        except (httpx.HTTPStatusError, httpx.RequestError, KeyError) as e:
+            logger.error(f"获取页面版本号失败: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"页面版本号处理失败: {e}")
+            return None
+        revids = {}
+        for chunk_revids in chunk_results:
+            revids.update(chunk_revids)
+        return revids
+
+    async def _query_revisions(self, chunk: list):
+        """
+        请求一组（最多50个）页面的当前修订版本（含正文），跟随续传
+        返回 (请求标题→最终标题, 最终标题→页面数据)
+        """
+        params = {
             "action": "query",
             "prop": "revisions",
-            "titles": name,
-            "rvprop": "content",
+            "titles": "|".join(chunk),
+            "rvprop": "ids|content",
             "format": "json",
             "redirects": "1"  # 启用重定向
         }
+        pages_by_title = {}
+        resolved = {}
+        while True:
+            data = await self._api_get(params)
+            query_data = data["query"]
+            resolved.update(self._resolve_titles(query_data, chunk))
+            for page_data in query_data.get("pages", {}).values():
+                # 内容过大时API会分批返回，已获得正文的页面不覆盖
+                if page_data.get("revisions") or page_data["title"] not in pages_by_title:
+                    pages_by_title[page_data["title"]] = page_data
+            # 处理API的续传
+            if "continue" not in data:
+                break
+            params = {**params, **data["continue"]}
+        return resolved, pages_by_title
+
+    async def _fetch_wikitext_chunk(self, chunk: list):
+        """下载一组（最多50个）页面的wikitext，返回 请求标题→(最终标题, wikitext)"""
         try:
-            response = await self.http_client.get(url, params=params2)
-            response.raise_for_status()
-            data = response.json()
+            resolved, pages_by_title = await self._query_revisions(chunk)
         except (httpx.HTTPStatusError, httpx.RequestError, KeyError) as e:
             logger.error(f"获取页面内容失败: {e}")
-            return name, None
+            return self._fallback_pages(chunk)
         except Exception as e:
             logger.error(f"页面内容处理失败: {e}")
-            return name, None
-        pages = data["query"]["pages"]
-        # 获取第一个页面的信息，因为API返回的page id是动态的
-        page_id = next(iter(pages))
-        page_data = pages[page_id]
-
-        name_out = page_data.get("title", name)
-        # 检查页面是否存在或是否包含修订版本
-        if "revisions" not in page_data or not page_data["revisions"]:
-            # 页面不存在或没有修订版本，返回None
-            wikitext = None
-        else:
-            wikitext = page_data["revisions"][0]["*"]
-        return name_out, wikitext
+            return self._fallback_pages(chunk)
 
-    async def get_images_url(self, image_titles: list):
-        """批量获取图片的详细信息"""
-        if not image_titles:
-            return []
-        url = "https://prts.wiki/api.php"
-        # 将图片标题列表转换为管道分隔的字符串
-        titles_str = "|".join([img["title"] if isinstance(img, dict) else img for img in image_titles])
+        results = {}
+        for title in chunk:
+            final = resolved.get(title, title)
+            page_data = pages_by_title.get(final, {})
+            name_out = page_data.get("title", title)
+            # 检查页面是否存在或是否包含修订版本
+            if not page_data.get("revisions"):
+                # 页面不存在或没有修订版本，返回None
+                results[title] = (name_out, None)
+                continue
+            revision = page_data["revisions"][0]
+            wikitext = revision["*"]
+            self.wikitext_cache.put(title, name_out, revision["revid"], wikitext)
+            results[title] = (name_out, wikitext)
+        return results
+
+    def _fallback_pages(self, chunk: list):
+        """请求失败（如wiki无法访问）时，有本地镜像则使用镜像中的页面"""
+        if self.mirror is None:
+            return {title: (title, None) for title in chunk}
+        logger.info(f"使用本地镜像中的 {len(chunk)} 个页面")
+        return self._mirror_pages(chunk)
+
+    def _covered_by_changes(self, entry: dict, now: float):
+        """
+        缓存项在增量同步覆盖的时间段内校验过，且最近一次轮询没有报告该页面变化
+        以重定向标题缓存的项不适用：recentchanges报告的是目标页面，磁盘上的这类缓存项不一定能随之失效
+        """
+        return (self.changes_since is not None and entry["name_out"] == entry["title"]
+                and entry["checked_time"] >= self.changes_since
+                and now - self.changes_checked_time <= self.changes_valid_for)
+
+    def mark_changes_checked(self, since: float, checked_time: float, valid_for: float):
+        """增量同步轮询完成后调用，since为连续处理变化的起始时间"""
+        self.changes_since = since
+        self.changes_checked_time = checked_time
+        self.changes_valid_for = valid_for
+
+    def invalidate_titles(self, titles):
+        """页面有变化时删除对应的wikitext缓存"""
+        for title in titles:
+            self.wikitext_cache.invalidate(title)
+
+    @stats.timed("search_model.get_wikitexts")
+    async def get_wikitexts(self, titles: list):
+        """
+        批量获取多个页面的wikitext，每50个标题一次请求，各请求并发执行，自动跟随重定向
+        返回 请求标题→(最终标题, wikitext) 的字典，页面不存在时wikitext为None
+        """
+        titles = list(dict.fromkeys(titles))  # 去重并保持顺序
+        if self.offline:
+            return self._mirror_pages(titles)
+        results = {}
+        stale = {}  # 需要校验版本号的标题→校验前的缓存项（等待期间缓存项可能已被增量同步删除）
+        missing = []
+        now = time.time()
+        for title in titles:
+            entry = self.wikitext_cache.get(title)
+            if entry is None:
+                missing.append(title)
+                stats.cache("wikitext", False)
+            elif now - entry["checked_time"] <= self.REVALIDATE_INTERVAL or self._covered_by_changes(entry, now):
+                # 最近校验过，直接使用缓存
+                results[title] = (entry["name_out"], entry["wikitext"])
+                stats.cache("wikitext", True)
+            else:
+                stale[title] = entry
+
+        if stale:
+            revids = await self.get_revision_ids(list(stale))
+            for title, entry in stale.items():
+                # 版本号未变化或校验失败时，继续使用缓存内容
+                if revids is None or revids.get(title) == entry["revid"]:
+                    if revids is not None:
+                        self.wikitext_cache.touch(title)
+                    results[title] = (entry["name_out"], entry["wikitext"])
+                    stats.cache("wikitext_revalidated", True)
+                else:
+                    missing.append(title)
+                    stats.cache("wikitext_revalidated", False)
+
+        if missing:
+            chunk_results = await asyncio.gather(
+                *(self._fetch_wikitext_chunk(chunk) for chunk in self._split_titles(missing)))
+            for chunk_result in chunk_results:
+                results.update(chunk_result)
+        return {title: results.get(title, (title, None)) for title in titles}
+
+    async def get_wikitext(self, name: str):
+        results = await self.get_wikitexts([name])
+        return results[name]
+
+    @staticmethod
+    def normalize_image_title(image):
+        """规范化图片标题：支持dict输入，下划线视为空格，合并多余空白"""
+        title = image["title"] if isinstance(image, dict) else image
+        return " ".join(title.replace("_", " ").split())
+
+    @classmethod
+    def image_file_name(cls, image):
+        """去掉“文件:”等前缀，得到首字母大写、以空格分隔的文件名，用作镜像中图片的键"""
+        title = cls.normalize_image_title(image)
+        for prefix in FILE_NAMESPACE_PREFIXES:
+            if title.startswith(prefix):
+                title = title[len(prefix):].strip()
+                break
+        return title[:1].upper() + title[1:]
+
+    @classmethod
+    def build_image_url(cls, image):
+        """
+        不请求API，在本地计算图片链接
+        MediaWiki的存储路径由文件名的md5决定：/{md5[0]}/{md5[0:2]}/{文件名}
+        """
+        # 文件名中空格存储为下划线，首字母大写
+        file_name = cls.image_file_name(image).replace(" ", "_")
+        digest = hashlib.md5(file_name.encode('utf-8')).hexdigest()
+        return f"{IMAGE_BASE_URL}/{digest[0]}/{digest[:2]}/{quote(file_name, safe=URL_SAFE_CHARS)}"
+
+    @stats.timed("search_model.verify_image_urls")
+    async def verify_image_urls(self, image_titles: list):
+        """批量校验本地计算的图片链接，用API结果修正缓存，返回不一致的图片标题"""
+        titles = list(dict.fromkeys(self.normalize_image_title(img) for img in image_titles))
+        chunks = self._split_titles(titles)
+        chunk_results = await asyncio.gather(*(self._fetch_images_chunk(chunk) for chunk in chunks))
+        mismatched = []
+        for chunk, api_urls in zip(chunks, chunk_results):
+            # 请求失败的一组不做校验，保留本地计算的链接，下次再校验
+            if api_urls is None:
+                continue
+            for title in chunk:
+                image_url = api_urls.get(title)
+                if image_url != self.build_image_url(title):
+                    mismatched.append(title)
+                    logger.info(f"图片链接校验不一致: {title}")
+                if image_url is None:
+                    self.image_url_cache.pop(title, None)
+                else:
+                    self.image_url_cache[title] = image_url
+        self._evict_image_urls()
+        return mismatched
+
+    def _evict_image_urls(self):
+        """超出容量时淘汰最久未使用的图片链接"""
+        while len(self.image_url_cache) > self.IMAGE_CACHE_SIZE:
+            self.image_url_cache.popitem(last=False)
+
+    async def _fetch_images_chunk(self, chunk: list):
+        """获取一组（最多50个）图片的链接，返回 图片标题→url，请求失败时返回None"""
         params = {
             "action": "query",
-            "titles": titles_str,
+            "titles": "|".join(chunk),
             "prop": "imageinfo",
             "iiprop": "url",
-            "format": "json"
+            "format": "json",
+            "redirects": "1"
         }
         try:
-            response = await self.http_client.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
+            query_data = (await self._api_get(params))["query"]
         except (httpx.HTTPStatusError, httpx.RequestError, KeyError) as e:
             logger.error(f"获取图片信息失败: {e}")
-            return []
+            return None
         except Exception as e:
             logger.error(f"图片信息处理失败: {e}")
-            return []
-        image_url_list = []
-        pages = data["query"]["pages"]
-        for page_id in pages:
-            page_data = pages[page_id]
-            if "imageinfo" in page_data and page_data["imageinfo"]:
-                image_url = page_data["imageinfo"][0]["url"]
-                image_url_list.append(image_url)
+            return None
+        page_urls = {}
+        for page_data in query_data.get("pages", {}).values():
+            if page_data.get("imageinfo"):
+                page_urls[page_data["title"]] = page_data["imageinfo"][0]["url"]
+        return {title: page_urls[final]
+                for title, final in self._resolve_titles(query_data, chunk).items() if final in page_urls}
+
+    @stats.timed("search_model.resolve_image_urls")
+    async def resolve_image_urls(self, image_titles: list):
+        """
+        批量获取图片链接，每50个标题一次请求，各请求并发执行
+        返回 图片标题（规范化后）→url 的字典，不存在的图片不包含在内
+        """
+        titles = list(dict.fromkeys(self.normalize_image_title(img) for img in image_titles))
+        results = {}
+        missing = []
+        for title in titles:
+            image_url = self.image_url_cache.get(title)
+            if image_url is not None:
+                self.image_url_cache.move_to_end(title)
+                results[title] = image_url
+            else:
+                missing.append(title)
+            stats.cache("image_url", image_url is not None)
+        if missing and self.offline:
+            # 镜像同步过图片时以镜像为准（不在镜像中的图片视为不存在），否则在本地计算链接
+            use_mirror = self.mirror.image_count() > 0
+            for title in missing:
+                image_url = (self.mirror.get_image_url(self.image_file_name(title)) if use_mirror
+                             else self.build_image_url(title))
+                if image_url is not None:
+                    results[title] = image_url
+                    self.image_url_cache[title] = image_url
+        elif missing and self.offline_image_url:
+            # 本地计算链接，无需等待网络请求
+            for title in missing:
+                image_url = self.build_image_url(title)
+                results[title] = image_url
+                self.image_url_cache[title] = image_url
+            if self.verify_image_url:
+                # 校验放在后台执行，不影响本次查询
+                task = asyncio.create_task(self.verify_image_urls(missing))
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_tasks.discard)
+        elif missing:
+            chunk_results = await asyncio.gather(
+                *(self._fetch_images_chunk(chunk) for chunk in self._split_titles(missing)))
+            for chunk_result in chunk_results:
+                for title, image_url in (chunk_result or {}).items():
+                    results[title] = image_url
+                    self.image_url_cache[title] = image_url
+        self._evict_image_urls()
+        return results
 
-        return image_url_list
+    async def get_images_url(self, image_titles: list):
+        """批量获取图片链接，按输入顺序返回列表，不存在的图片会被跳过"""
+        if not image_titles:
+            return []
+        image_urls = await self.resolve_image_urls(image_titles)
+        titles = dict.fromkeys(self.normalize_image_title(img) for img in image_titles)
+        return [image_urls[title] for title in titles if title in image_urls]
 
     # 程序退出时关闭http客户端
     async def close_http_client(self):
         """
-        异步关闭HTTP客户端，避免资源泄露
+        异步关闭HTTP客户端，避免资源泄露；未发送过请求时无需关闭
         """
+        if self._http_client is None:
+            return
         try:
-            await self.http_client.aclose()
+            await self._http_client.aclose()
+            self._http_client = None
             logger.info("HTTP客户端已关闭")
         except RuntimeError as e:
             # Windows系统上可能会出现"Event loop is closed"错误，这是正常的
@@ -0,0 +1,176 @@
+import asyncio, json, logging, importlib
+from stats import stats
+
+logger = logging.getLogger(__name__)
+
+"""
+常驻服务模式：JSON Lines over TCP
+每行一个请求：{"id": 1, "type": "ganyuan", "query": "娜仁图亚 2"}
+每行一个响应：{"id": 1, "ok": true, "type": "ganyuan", "result": {...}}
+同一连接上的请求并发处理，响应按完成顺序返回，用id对应
+type可为 ganyuan/other/gongzhao/stage/enemy_query，也可用主程序的功能编号 1~5
+type为stats时返回各阶段的耗时统计，query为prometheus时返回Prometheus文本格式
+"""
+
+QUERY_TYPES = {
+    "1": "ganyuan", "ganyuan": "ganyuan",
+    "2": "other", "other": "other",
+    "3": "gongzhao", "gongzhao": "gongzhao",
+    "4": "stage", "stage": "stage",
+    "5": "enemy_query", "enemy_query": "enemy_query",
+    "stats": "stats",
+}
+
+# 一行请求的最大字节数（asyncio默认为64KiB），超过时返回错误并关闭连接
+REQUEST_LIMIT = 1024 * 1024
+
+# 查询类型→(模块名, 初始化函数名)，模块在该类型首次被查询时才导入
+FEATURE_MODULES = {
+    "ganyuan": ("ganyuan", "initialize_ganyuan"),
+    "other": ("other_thing", "initialize_other_thing"),
+    "gongzhao": ("gongzhao_model", "initialize_gongzhao_model"),
+    "stage": ("stage_enemy", "initialize_stage_enemy"),
+    "enemy_query": ("enemy_query", "initialize_enemy_query"),
+}
+
+
+def to_jsonable(obj, include_wikitext=False):
+    """将查询结果（命名元组、列表、字典）转换为可json序列化的结构，默认去掉体积较大的wikitext"""
+    if hasattr(obj, "_asdict"):
+        obj = obj._asdict()
+    if isinstance(obj, dict):
+        return {key: to_jsonable(value, include_wikitext) for key, value in obj.items()
+                if include_wikitext or key != "wikitext"}
+    if isinstance(obj, (list, tuple)):
+        return [to_jsonable(item, include_wikitext) for item in obj]
+    return obj
+
+
+class QueryService:
+    def __init__(self, config):
+        self.config = config
+        self.features = {}  # 查询类型→已初始化的功能实例
+
+    def feature(self, route: str):
+        """返回查询类型对应的功能实例，首次使用时导入模块并初始化"""
+        instance = self.features.get(route)
+        if instance is None:
+            module_name, initializer = FEATURE_MODULES[route]
+            module = importlib.import_module(module_name)
+            instance = self.features[route] = getattr(module, initializer)(self.config)
+        return instance
+
+    async def warm_up(self, routes=None):
+        """预先加载本地数据集，首个查询无需等待；routes为要预加载的查询类型，默认全部"""
+        routes = set(FEATURE_MODULES if routes is None else routes)
+        jobs = []
+        if "ganyuan" in routes:
+            from operator_index import operator_index
+            jobs.append(operator_index.load())
+        if "gongzhao" in routes:
+            jobs.append(self.feature("gongzhao").get_public_recruitment_data())
+        if "stage" in routes:
+            jobs.append(self.feature("stage").ensure_enemy_data())
+        if "enemy_query" in routes:
+            jobs.append(self.feature("enemy_query").get_table())
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"预加载数据失败: {result}")
+
+    async def handle_query(self, query_type: str, query: str):
+        """按类型分发查询，返回可json序列化的结果，未找到时为None"""
+        route = QUERY_TYPES.get(str(query_type))
+        if route == "ganyuan":
+            image, result = await self.feature(route).query(query)
+            if result is None:
+                return None
+            return {"image_url": image, "operator": to_jsonable(result)}
+        if route == "other":
+            return to_jsonable(await self.feature(route).clean_over_wiki(query))
+        if route == "gongzhao":
+            gongzhao_model = self.feature(route)
+            return to_jsonable(await gongzhao_model.query(gongzhao_model.parse_tags(query)))
+        if route == "stage":
+            return to_jsonable(await self.feature(route).query(query))
+        if route == "enemy_query":
+            return to_jsonable(await self.feature(route).query(query))
+        if route == "stats":
+            return stats.dump_prometheus() if query == "prometheus" else stats.to_dict()
+        raise ValueError(f"未知的查询类型: {query_type}")
+
+    async def handle_request(self, request: dict):
+        """处理一个请求，返回响应字典"""
+        response = {"id": request.get("id"), "type": request.get("type")}
+        try:
+            result = await self.handle_query(request.get("type"), str(request.get("query", "")))
+            response.update(ok=True, result=result)
+        except ValueError as e:
+            response.update(ok=False, error=str(e))
+        except Exception as e:
+            logger.error(f"处理请求失败: {e}")
+            response.update(ok=False, error=f"处理请求失败: {e}")
+        return response
+
+    async def handle_connection(self, reader, writer):
+        """处理一个客户端连接，逐行读取请求并并发处理"""
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def send(response):
+            async with write_lock:
+                writer.write((json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8"))
+                await writer.drain()
+
+        async def respond(line):
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("请求必须为json对象")
+            except ValueError as e:
+                response = {"id": None, "ok": False, "error": f"无效的请求: {e}"}
+            else:
+                response = await self.handle_request(request)
+            await send(response)
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    # 请求行过长，之后的数据无法再按行对应请求，返回错误后关闭连接
+                    await send({"id": None, "ok": False, "error": f"无效的请求: 请求超过 {REQUEST_LIMIT} 字节"})
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError as e:
+            logger.info(f"客户端连接断开: {e}")
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        """启动服务，直到进程退出；HTTP客户端、缓存和数据集在整个进程内复用"""
+        from search_model import search_model
+        await self.warm_up()
+        # 定时轮询recentchanges，只让有变化的页面的缓存失效
+        tracker = None
+        if not search_model.offline:
+            import recent_changes
+            tracker = recent_changes.initialize_recent_changes(self.config)
+            tracker.start()
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=REQUEST_LIMIT)
+        logger.info(f"查询服务已启动: {host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if tracker is not None:
+                tracker.stop()
+            await search_model.close_http_client()
@@ -1,87 +1,181 @@
-import time, json, re, logging, httpx, os
-from collections import namedtuple
-from bs4 import BeautifulSoup
+import time, json, re, logging, httpx, os, asyncio
+from collections import namedtuple, OrderedDict
 from search_model import search_model
+from name_index import NameIndex
+from enemy_store import EnemyStore, REQUIRED_COLUMNS, LEVEL_NAMES
+from stats import stats
+from wikitext_parser import parse_page, clean_wikitext
+from enemy_levels import EnemyLevel, LEVEL_STAT_KEYS, parse_levels, format_number
 
-# 定义敌人信息的命名元组
+# 定义敌人信息的命名元组，levels为各等级的数值（EnemyLevel），字符串字段为0级的原始文本
 EnemyInfo = namedtuple('EnemyInfo', [
     'image_url', 'name', 'race', 'level', 'describe', 'attack_type', 'damage_type', 'motion', 'endure', 'attack',
-    'defence', 'move_speed', 'attack_speed', 'resistance', 'enemy_damage_res', 'ability'])
+    'defence', 'move_speed', 'attack_speed', 'resistance', 'enemy_damage_res', 'ability', 'levels'],
+    defaults=((),))
 
 # 定义关卡信息的命名元组
 StageInfo = namedtuple('StageInfo', ['image_url', 'stage_name', 'wikitext'])  # 待完善
 
+# 定义一次查询结果的命名元组：敌人查询时stage_name为None，
+# 关卡查询时stage_info和enemies有值，关卡+敌人查询时enemy_name为要查看的敌人
+StageQueryResult = namedtuple('StageQueryResult', ['enemy_info', 'stage_info', 'enemies', 'enemy_name', 'stage_name'])
+
 # 定义关卡下怪物信息的命名元组
 StageEnemyInfo = namedtuple('StageEnemyInfo', [
     'image_url', 'enemy_name', 'enemy_number', 'status', 'level', 'endure', 'attack', 'defence', 'resistance',
     'attack_speed', 'weight', 'move_speed', 'attack_range'])
 
-# 配置日志
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# 预编译wikitext清理正则表达式
-COLOR_PATTERN = re.compile(r'\{\{color\|#[0-9A-F]{6}\|(.*?)}}')
-LINK_PATTERN_1 = re.compile(r'\[\[([^]|]+)\|([^]]+)]]')
-LINK_PATTERN_2 = re.compile(r'\[\[([^]]+)]]')
-BOLD_ITALIC_PATTERN = re.compile(r"''+(.*?)''+")
-
-
-def clean_wikitext(text):
-    """清理wikitext中的标记，提取纯文本内容（同步版本）"""
-    if not text:
-        return ""  # 返回空字符串而不是None
-
-    # 移除颜色标记
-    text = COLOR_PATTERN.sub(r'\1', text)
-
-    # 移除其他常见的wikitext标记
-    text = LINK_PATTERN_1.sub(r'\2', text)  # [[链接|显示文字]] -> 显示文字
-    text = LINK_PATTERN_2.sub(r'\1', text)  # [[链接]] -> 链接
-    text = BOLD_ITALIC_PATTERN.sub(r'\1', text)  # 移除粗体和斜体标记
-    text = text.replace('*', '')
-    return text.strip()
+# 敌人完整数据所在的页面
+ENEMY_DATA_TITLE = "敌人一览/数据"
+
+# 关卡页面中表示一行敌人的模板名，只从这些模板中提取敌人，其他模板即使有名称、数值参数也不视为敌人行
+# 未在PRTS的真实页面上核对，页面使用其他模板名时找不到敌人，回退到渲染后的敌人表格
+STAGE_ENEMY_TEMPLATES = ('关卡敌人',)
+# 关卡敌人表各列在wikitext模板中可能使用的参数名，顺序与输出的stats_labels一致
+STAGE_ENEMY_NAME_KEYS = ('名称', '敌人', '敌人名称', 'name')
+STAGE_ENEMY_STAT_KEYS = [
+    ('数量', 'count'),
+    ('地位', '地位级别', 'status'),
+    ('等级', 'level'),
+    ('生命值', '最大生命值', '耐久', 'hp'),
+    ('攻击力', '攻击', 'atk'),
+    ('防御力', '防御', 'def'),
+    ('法术抗性', '法抗', 'res'),
+    ('攻击间隔', '攻击速度', 'interval'),
+    ('重量', '重量等级', 'weight'),
+    ('移动速度', '移速', 'speed'),
+    ('攻击范围', '攻击距离', 'range'),
+    ('目标价值', 'value'),
+]
+
+# 敌人页面中基础信息（敌人信息/common2模板）和等级数值（敌人信息/levelcontent模板）的参数名
+ENEMY_COMMON_TEMPLATE = "敌人信息/common2"
+ENEMY_LEVEL_TEMPLATE = "敌人信息/levelcontent"
+ENEMY_COMMON_KEYS = {
+    'name': '名称',
+    'enemy_race': '种类',
+    'level': '地位级别',
+    'attack_type': '攻击方式',
+    'damage_type': '伤害类型',
+    'motion': '行动方式',
+    'describe': '描述',
+    'ability': '能力',
+}
+ENEMY_LEVEL_KEYS = {
+    'endure': '最大生命值',
+    'attack': '攻击力',
+    'defence': '防御力',
+    'move_speed': '移动速度',
+    'attack_speed': '攻击速度',
+    'resistance': '法术抗性',
+}
+# EnemyInfo中的数值字段对应的EnemyLevel数值，本地数据库和敌人页面都由0级数值统一输出
+ENEMY_LEVEL_FIELDS = {
+    'endure': 'hp',
+    'attack': 'atk',
+    'defence': 'defence',
+    'move_speed': 'move_speed',
+    'attack_speed': 'attack_interval',
+    'resistance': 'res',
+}
+
+# 本地记录命中时必须有数值的0级数值（EnemyLevel的属性）
+REQUIRED_LEVEL_STATS = ('hp', 'atk', 'defence', 'res')
+
+
+def level_fields(level, fallback: dict):
+    """EnemyInfo中的数值字段：0级有该数值时按format_number输出，否则使用原始文本"""
+    fields = {}
+    for field, name in ENEMY_LEVEL_FIELDS.items():
+        value = getattr(level, name) if level is not None else None
+        fields[field] = format_number(value) if value is not None else fallback.get(field, "")
+    return fields
+
+
+def extract_stage_enemies(page):
+    """从关卡页面（PageTemplates）的敌人模板（STAGE_ENEMY_TEMPLATES）中提取敌人名称及12项数值"""
+    enemies = []
+    for template in page.all:
+        if template.name not in STAGE_ENEMY_TEMPLATES:
+            continue
+        params = template.params
+        name = next((params[key] for key in STAGE_ENEMY_NAME_KEYS if params.get(key)), None)
+        if not name:
+            continue
+        stats = [next((params[key] for key in keys if key in params), None) for keys in STAGE_ENEMY_STAT_KEYS]
+        # 不含生命值、攻击力、防御力的模板不是敌人行
+        if all(stat is None for stat in stats[3:6]):
+            continue
+        enemies.append({
+            "name": clean_wikitext(name),
+            "stats": [clean_wikitext(stat) if stat else "" for stat in stats]
+        })
+    return enemies
 
 
 class StageEnemy:
     def __init__(self, config=None):
         self.config = config
         self.enemy_data = []  # 只存储敌人名称列表
+        self.enemy_names = frozenset()  # 敌人名称集合，用于判断输入是否为敌人
+        self.enemy_index = NameIndex()  # 规范化名称索引，用于模糊匹配
         self.last_update_time = 0
         self.UPDATE_INTERVAL = 300  # 5分钟更新一次
+        # 敌人数据对应的「敌人一览/数据」修订版本号，版本未变化时无需重新解析
+        self.enemy_data_revid = None
+        # 敌人数据每次替换时加1，派生数据（如enemy_query的列存储）据此判断是否需要重建
+        self.data_version = 0
+        # 后台刷新任务，数据过期时不阻塞查询
+        self._refresh_task = None
+        self._refresh_failures = 0
+        self._next_refresh_time = 0  # 刷新失败后，在此时间之前不再重试
+        self.REFRESH_BACKOFF_BASE = 30  # 失败退避的初始间隔（秒）
+        self.REFRESH_BACKOFF_MAX = 3600
         self.stage_image = self.config["image"]["stage_image_output"]
         self.enemy_image = self.config["image"]["enemy_image_output"]
 
         # 确保data目录存在
         self.DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
         self.ENEMY_DATA_FILE = os.path.join(self.DATA_DIR, 'enemy_data.json')
+        self.ENEMY_DB_FILE = os.path.join(self.DATA_DIR, 'enemy_data.db')
 
         # 创建data目录（如果不存在）
         os.makedirs(self.DATA_DIR, exist_ok=True)
+        # 敌人完整数据的本地存储
+        self.enemy_store = EnemyStore(self.ENEMY_DB_FILE)
+
+        # 已加载的关卡，关卡名→(加载时间, (StageInfo, 敌人列表))
+        self.stage_cache = OrderedDict()
+        self.STAGE_CACHE_SIZE = 32
+        self.STAGE_CACHE_TTL = 60
 
         # 预编译正则表达式以提高性能
         self.JSON_PATTERN = re.compile(r'\{[^{}]*(?:\{[^{}]*}[^{}]*)*}')
-        self.STAGE_IMAGE_ID_PATTERN = re.compile(r"关卡id\s*=\s*([^|\n]+)")
-        self.COMMON_PATTERN = re.compile(r"\{\{敌人信息/common2\s*\|(.*?)}}", re.DOTALL)
-        self.LEVEL_PATTERN = re.compile(r"\{\{敌人信息/levelcontent\s*\|(.*?index=0.*?)}}", re.DOTALL)
-
-        # 预编译敌人信息字段正则表达式
-        self.ENEMY_FIELDS_PATTERNS = {
-            'name': re.compile(r"[|]名称\s*=\s*([^\n|}]+)"),
-            'enemy_race': re.compile(r"[|]种类\s*=\s*([^\n|}]+)"),
-            'level': re.compile(r"[|]地位级别\s*=\s*([^\n|}]+)"),
-            'attack_type': re.compile(r"[|]攻击方式\s*=\s*([^\n|}]+)"),
-            'damage_type': re.compile(r"[|]伤害类型\s*=\s*([^\n|}]+)"),
-            'motion': re.compile(r"[|]行动方式\s*=\s*([^\n|}]+)"),
-            'describe': re.compile(r"[|]描述\s*=\s*([^\n|}]+)"),
-            'ability': re.compile(r"[|]能力\s*=\s*([^\n|}]+)"),
-            'endure': re.compile(r"[|]最大生命值\s*=\s*([^\n|}]+)"),
-            'attack': re.compile(r"[|]攻击力\s*=\s*([^\n|}]+)"),
-            'defence': re.compile(r"[|]防御力\s*=\s*([^\n|}]+)"),
-            'move_speed': re.compile(r"[|]移动速度\s*=\s*([^\n|}]+)"),
-            'attack_speed': re.compile(r"[|]攻击速度\s*=\s*([^\n|}]+)"),
-            'resistance': re.compile(r"[|]法术抗性\s*=\s*([^\n|}]+)")
-        }
+
+    def set_enemy_data(self, enemy_names: list):
+        """替换敌人名称数据，并重建名称集合和索引（先建好再一起替换，查询不会看到不一致的数据）"""
+        names = frozenset(enemy_names)
+        index = NameIndex((name, name) for name in enemy_names)
+        self.enemy_names, self.enemy_index, self.enemy_data = names, index, enemy_names
+        self.data_version += 1
+
+    def parse_enemy_records(self, wikitext: str):
+        """解析「敌人一览/数据」的wikitext，返回(敌人名称列表, 完整记录列表)"""
+        enemy_names = []
+        enemy_records = []
+        json_matches = self.JSON_PATTERN.findall(wikitext)
+        for json_str in json_matches:
+            try:
+                enemy = json.loads(json_str)
+                # 提取敌人名称
+                if 'name' in enemy:
+                    enemy_names.append(enemy['name'])
+                    enemy_records.append(enemy)
+            except json.JSONDecodeError:
+                logger.error(f"JSON解析错误: {json_str}")
+        return enemy_names, enemy_records
 
     async def update_enemy_data(self, force_update=False):
         """定时更新敌人名称数据"""
@@ -90,27 +184,23 @@ class StageEnemy:
         if not force_update and current_time - self.last_update_time <= self.UPDATE_INTERVAL:
             return False  # 返回False表示未执行更新
         try:
-            name_out, wikitext = await search_model.get_wikitext("敌人一览/数据")
+            name_out, wikitext = await search_model.get_wikitext(ENEMY_DATA_TITLE)
+            revid = search_model.cached_revision_id(ENEMY_DATA_TITLE)
+            if wikitext and revid is not None and revid == self.enemy_data_revid and self.enemy_data:
+                # 页面版本未变化，只记录本次检查的时间
+                self.last_update_time = current_time
+                self.save_enemy_data()
+                return True
             if wikitext:
-                # 解析wikitext，只提取敌人名称
-                enemy_names = []
-                json_matches = self.JSON_PATTERN.findall(wikitext)
-                for json_str in json_matches:
-                    try:
-                        enemy = json.loads(json_str)
-                        # 提取敌人名称
-                        if 'name' in enemy:
-                            enemy_names.append(enemy['name'])
-                    except json.JSONDecodeError:
-                        logger.error(f"JSON解析错误: {json_str}")
-                self.enemy_data = enemy_names
+                # 解析wikitext，提取敌人的完整记录；页面较大，在线程中解析以免阻塞其他查询
+                with stats.timer("stage_enemy.parse_enemy_data"):
+                    enemy_names, enemy_records = await asyncio.to_thread(self.parse_enemy_records, wikitext)
+                # 完整记录写入本地数据库（同样在线程中进行），名称列表仍写入json文件
+                await asyncio.to_thread(self.enemy_store.replace_all, enemy_records)
+                self.set_enemy_data(enemy_names)
                 self.last_update_time = current_time
-                # 将数据写入data文件夹下的enemy_data.json文件
-                with open(self.ENEMY_DATA_FILE, 'w', encoding='utf-8') as f:
-                    json.dump({
-                        'enemy_data': self.enemy_data,
-                        'last_update_time': self.last_update_time
-                    }, f, ensure_ascii=False, indent=2)
+                self.enemy_data_revid = revid
+                self.save_enemy_data()
                 logger.info(f"已更新敌人数据，共获取到 {len(self.enemy_data)} 个敌人")
                 return True  # 返回True表示成功执行更新
             return False  # 返回False表示未成功执行更新
@@ -118,17 +208,33 @@ class StageEnemy:
             logger.error(f"更新敌人数据失败: {e}")
             return False  # 返回False表示更新失败
 
+    def save_enemy_data(self):
+        """将数据写入data文件夹下的enemy_data.json文件"""
+        with open(self.ENEMY_DATA_FILE, 'w', encoding='utf-8') as f:
+            json.dump({
+                'enemy_data': self.enemy_data,
+                'last_update_time': self.last_update_time,
+                'revid': self.enemy_data_revid
+            }, f, ensure_ascii=False, indent=2)
+
     async def load_enemy_data(self):
-        """从data文件夹下的enemy_data.json文件加载敌人数据"""
+        """
+        从data文件夹下的enemy_data.json文件加载敌人数据
+        仅在本地没有任何数据时等待下载，数据过期时在后台刷新
+        """
         try:
             # 先尝试从文件加载数据
             with open(self.ENEMY_DATA_FILE, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                self.enemy_data = data.get('enemy_data', [])  # 只加载敌人名称列表
+                self.set_enemy_data(data.get('enemy_data', []))  # 只加载敌人名称列表
                 self.last_update_time = data.get('last_update_time', 0)
-            # 检查数据是否需要更新
-            await self.update_enemy_data()  # 尝试更新，但不会每次都强制更新
+                self.enemy_data_revid = data.get('revid')
             logger.info(f"已加载敌人数据，共 {len(self.enemy_data)} 个敌人")
+            # 本地数据库为空时视为过期
+            if self.enemy_store.count() == 0:
+                self.last_update_time = 0
+                self.enemy_data_revid = None
+            self.schedule_refresh()
         except FileNotFoundError:
             logger.info("未找到敌人数据文件，将创建新文件")
             # 如果文件不存在，强制更新数据
@@ -139,38 +245,144 @@ class StageEnemy:
             logger.error(f"加载敌人数据失败: {e}")
         return self.enemy_data
 
+    async def ensure_enemy_data(self):
+        """返回当前的敌人数据，首次使用时加载，过期时安排后台刷新"""
+        if not self.enemy_data:
+            return await self.load_enemy_data()
+        self.schedule_refresh()
+        return self.enemy_data
+
+    def schedule_refresh(self):
+        """数据过期时启动后台刷新，已有刷新任务或处于失败退避期时跳过"""
+        current_time = time.time()
+        if current_time - self.last_update_time <= self.UPDATE_INTERVAL:
+            return False
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return False
+        if current_time < self._next_refresh_time:
+            return False
+        self._refresh_task = asyncio.create_task(self._background_refresh())
+        return True
+
+    async def _background_refresh(self):
+        """后台刷新敌人数据，新数据在update_enemy_data中整体替换，失败时指数退避"""
+        updated = await self.update_enemy_data(force_update=True)
+        if updated:
+            self._refresh_failures = 0
+            self._next_refresh_time = 0
+        else:
+            self._refresh_failures += 1
+            delay = min(self.REFRESH_BACKOFF_BASE * 2 ** (self._refresh_failures - 1), self.REFRESH_BACKOFF_MAX)
+            self._next_refresh_time = time.time() + delay
+            logger.info(f"敌人数据刷新失败，{delay} 秒后重试")
+        return updated
+
+    def invalidate_titles(self, titles):
+        """页面有变化时调用（见recent_changes.py）：「敌人一览/数据」变化时立即刷新，并丢弃变化的关卡缓存"""
+        if ENEMY_DATA_TITLE in titles:
+            self.last_update_time = 0
+            self._next_refresh_time = 0
+            if self.enemy_data:
+                self.schedule_refresh()
+        for title in titles:
+            self.stage_cache.pop(self.normalize_stage_name(title), None)
+
+    async def wait_for_refresh(self):
+        """等待正在进行的后台刷新完成（单次运行的程序退出前调用）"""
+        if self._refresh_task is not None and not self._refresh_task.done():
+            await self._refresh_task
+
     async def find_exact_enemy_name(self, input_name):
         """在本地敌人数据中查找完全匹配的敌人名称"""
-        if not self.enemy_data:
-            await self.load_enemy_data()
+        await self.ensure_enemy_data()
         # 首先尝试精确匹配
-        if input_name in self.enemy_data:
+        if input_name in self.enemy_names:
             return input_name
-        # 如果没有精确匹配，尝试清理输入名称后匹配
-        cleaned_input = re.sub(r'[^\u4e00-\u9fff\w]', '', input_name)
-        cleaned_enemy = [re.sub(r'[^\u4e00-\u9fff\w]', '', enemy_name) for enemy_name in self.enemy_data]
-        # 使用enumerate避免重复查找索引
-        for i, r in enumerate(cleaned_enemy):
-            if r == cleaned_input:
-                return self.enemy_data[i]
-        # 若未找到精确匹配，则选取包含该字段的最短项
-        matching_items = []
-        for i, r in enumerate(cleaned_enemy):
-            if cleaned_input in r:
-                matching_items.append((len(r), self.enemy_data[i]))
-        # 如果有包含该字段的项，返回其中最短的
-        if matching_items:
-            matching_items.sort(key=lambda x: x[0])  # 按长度排序
-            shortest_item = matching_items[0][1]
-            print(f"未找到精确匹配项，使用包含该字段的最短项: {shortest_item}")
-            return shortest_item
-        return input_name
+        # 如果没有精确匹配，使用预先建立的规范化名称索引
+        enemy_name, exact = self.enemy_index.lookup(input_name)
+        if enemy_name is None:
+            return input_name
+        if not exact:
+            print(f"未找到精确匹配项，使用包含该字段的最短项: {enemy_name}")
+        return enemy_name
 
     async def get_enemy_image(self, name: str):
         """异步获取敌人的image"""
         name = f"文件:头像 敌人 {name}.png"
         return await search_model.get_images_url([name])
 
+    @staticmethod
+    def record_level(record: dict):
+        """本地数据库记录中原始数据的0级数值（EnemyLevel），没有原始数据时返回None"""
+        raw = record.get("raw")
+        return EnemyLevel.from_params(0, json.loads(raw)) if raw else None
+
+    @classmethod
+    def record_complete(cls, record):
+        """
+        本地记录是否足以代替敌人页面：REQUIRED_COLUMNS都有值，且0级的生命值、攻击力、防御力、法术抗性为数值
+        只有评级（如endure: "E"）的记录不算完整，需要请求敌人页面
+        """
+        if not record or not all(record[column] for column in REQUIRED_COLUMNS):
+            return False
+        level = cls.record_level(record)
+        return level is not None and all(getattr(level, name) is not None for name in REQUIRED_LEVEL_STATS)
+
+    @classmethod
+    def enemy_info_from_record(cls, record: dict, image_url):
+        """由本地数据库中的记录生成EnemyInfo，原始记录中有数值时作为0级数值，与parse_enemy_page的结果一致"""
+        level = cls.record_level(record)
+        return EnemyInfo(
+            image_url=image_url,
+            name=record["name"],
+            race=record["race"] or '无',
+            level=LEVEL_NAMES.get(record["level"], record["level"]),
+            describe=clean_wikitext(record["describe"]),
+            attack_type=record["attack_type"],
+            damage_type=record["damage_type"],
+            motion=record["motion"],
+            **level_fields(level, record),
+            enemy_damage_res=format_number(level.damage_res) if level and level.damage_res is not None else "",
+            ability=clean_wikitext(record["ability"]),
+            levels=(level,) if level and level.has_values() else ()
+        )
+
+    @staticmethod
+    def parse_enemy_page(exact_enemy_name: str, page, image_url):
+        """从敌人页面（PageTemplates）的common2和levelcontent模板中提取敌人信息"""
+        # 基础信息 (common2模板)
+        common = page.first(ENEMY_COMMON_TEMPLATE)
+        common_params = common.params if common else {}
+        # 等级信息 (levelcontent模板)，取index=0的等级
+        levels = page.find(ENEMY_LEVEL_TEMPLATE)
+        level = next((template for template in levels if template.get("index") == "0"),
+                     levels[0] if levels else None)
+        level_params = level.params if level else {}
+        enemy_levels = parse_levels(levels)
+
+        fields = {field: clean_wikitext(common_params.get(key)) for field, key in ENEMY_COMMON_KEYS.items()}
+        values = {field: level_params.get(key, "") for field, key in ENEMY_LEVEL_KEYS.items()}
+        damage_res = next((params[key] for params in (level_params, common_params)
+                           for key in LEVEL_STAT_KEYS['damage_res'] if params.get(key)), "")
+        # 种类为空的敌人显示为“无”
+        enemy_race = fields['enemy_race'] or ('无' if ENEMY_COMMON_KEYS['enemy_race'] in common_params else "")
+
+        return EnemyInfo(
+            image_url=image_url,
+            name=fields['name'] or exact_enemy_name,
+            race=enemy_race,
+            level=LEVEL_NAMES.get(fields['level'], fields['level']),
+            describe=fields['describe'],
+            attack_type=fields['attack_type'],
+            damage_type=fields['damage_type'],
+            motion=fields['motion'],
+            **level_fields(enemy_levels[0] if enemy_levels else None, values),
+            enemy_damage_res=clean_wikitext(damage_res),
+            ability=fields['ability'],
+            levels=enemy_levels
+        )
+
+    @stats.timed("stage_enemy.get_enemy_info")
     async def get_enemy_info(self, enemy_name: str):
         """获取敌人信息和图片"""
         try:
@@ -178,117 +390,22 @@ class StageEnemy:
             exact_enemy_name = await self.find_exact_enemy_name(enemy_name)
             if not exact_enemy_name:
                 return print(f"未找到敌人: {enemy_name}")
+            # 本地数据库中的记录足够完整时，直接使用，无需请求页面
+            record = self.enemy_store.get(exact_enemy_name)
+            store_hit = self.record_complete(record)
+            stats.cache("enemy_store", store_hit)
+            if store_hit:
+                return self.enemy_info_from_record(record, await self.get_enemy_image(exact_enemy_name))
             # 通过get_wikitext获取敌人详细信息
             name_out, wikitext = await search_model.get_wikitext(exact_enemy_name)
             if not wikitext:
                 return None
-            # 使用正则表达式从wikitext中提取敌人信息
-            # 提取基础信息 (common2模板)
-            common_match = self.COMMON_PATTERN.search(wikitext)
-            # 提取等级信息 (levelcontent模板)
-            level_match = self.LEVEL_PATTERN.search(wikitext)
-            # 初始化字段
-            name = exact_enemy_name
-            enemy_race = ""
-            level = ""
-            describe = ""
-            attack_type = ""
-            damage_type = ""
-            motion = ""
-            ability = ""
-            endure = ""
-            attack = ""
-            defence = ""
-            move_speed = ""
-            attack_speed = ""
-            resistance = ""
-            enemy_damage_res = ""
-
-            # 解析common2模板中的信息
-            if common_match:
-                common_content = common_match.group(1)
-                # 提取各种字段
-                fields_map = {
-                    'name': 'name',
-                    'enemy_race': 'enemy_race',
-                    'level': 'level',
-                    'attack_type': 'attack_type',
-                    'damage_type': 'damage_type',
-                    'motion': 'motion',
-                    'describe': 'describe'
-                }
-                for field_key, var_name in fields_map.items():
-                    pattern = self.ENEMY_FIELDS_PATTERNS[field_key]
-                    match = pattern.search(common_content)
-                    if match:
-                        value = clean_wikitext(match.group(1).strip())
-                        if var_name == 'name':
-                            name = value
-                        elif var_name == 'enemy_race':
-                            if value == '':
-                                enemy_race = '无'
-                            else:
-                                enemy_race = value
-                        elif var_name == 'level':
-                            level = value
-                        elif var_name == 'attack_type':
-                            attack_type = value
-                        elif var_name == 'damage_type':
-                            damage_type = value
-                        elif var_name == 'motion':
-                            motion = value
-                        elif var_name == 'describe':
-                            describe = value
-
-            # 解析levelcontent模板中的信息
-            if level_match:
-                level_content = level_match.group(1)
-                # 提取数值字段
-                fields_map = {
-                    'endure': 'endure',
-                    'attack': 'attack',
-                    'defence': 'defence',
-                    'move_speed': 'move_speed',
-                    'attack_speed': 'attack_speed',
-                    'resistance': 'resistance'
-                }
-                for field_key, var_name in fields_map.items():
-                    pattern = self.ENEMY_FIELDS_PATTERNS[field_key]
-                    match = pattern.search(level_content)
-                    if match:
-                        value = match.group(1).strip()
-                        if var_name == 'endure':
-                            endure = value
-                        elif var_name == 'attack':
-                            attack = value
-                        elif var_name == 'defence':
-                            defence = value
-                        elif var_name == 'move_speed':
-                            move_speed = value
-                        elif var_name == 'attack_speed':
-                            attack_speed = value
-                        elif var_name == 'resistance':
-                            resistance = value
-
+            # 版本号在获取图片前取得，与wikitext对应
+            revid = search_model.cached_revision_id(exact_enemy_name)
             image_url = await self.get_enemy_image(exact_enemy_name)
-            return EnemyInfo(
-                image_url=image_url,
-                name=name,
-                race=enemy_race,
-                level=level,
-                describe=describe,
-                attack_type=attack_type,
-                damage_type=damage_type,
-                motion=motion,
-                endure=endure,
-                attack=attack,
-                defence=defence,
-                move_speed=move_speed,
-                attack_speed=attack_speed,
-                resistance=resistance,
-                enemy_damage_res=enemy_damage_res,
-                ability=ability
-            )
+            page = parse_page(wikitext, exact_enemy_name, revid)
+            with stats.timer("stage_enemy.parse_enemy_page"):
+                return self.parse_enemy_page(exact_enemy_name, page, image_url)
         except (httpx.HTTPStatusError, httpx.RequestError) as e:
             logger.error(f"获取敌人信息失败: {e}")
             return None
@@ -314,110 +431,168 @@ class StageEnemy:
             print(f"移动速度: {enemy_info.move_speed}")
             print(f"攻击速度: {enemy_info.attack_speed}")
             print(f"法术抗性: {enemy_info.resistance}")
+            if enemy_info.enemy_damage_res:
+                print(f"损伤抵抗: {enemy_info.enemy_damage_res}")
             if enemy_info.ability:
                 print(f"能力: {enemy_info.ability}")
-
-    async def get_stage_image(self, wikitext: str):
+            # 有多个等级时逐级输出数值
+            if len(enemy_info.levels) > 1:
+                for level in enemy_info.levels:
+                    print(f"等级{level.index}: 生命值 {format_number(level.hp)}，攻击力 {format_number(level.atk)}，"
+                          f"防御力 {format_number(level.defence)}，法术抗性 {format_number(level.res)}，"
+                          f"攻击间隔 {format_number(level.attack_interval)}，移动速度 {format_number(level.move_speed)}，"
+                          f"重量 {format_number(level.weight)}")
+
+    async def get_stage_image(self, page):
         """获取关卡地图缩略图"""
-        match = self.STAGE_IMAGE_ID_PATTERN.search(wikitext)
-        if match:
-            stage_image_id = match.group(1)
+        stage_image_id = page.param("关卡id")
+        if stage_image_id:
             return f"https://torappu.prts.wiki/assets/map_preview/{stage_image_id}.png"
         return ""
 
+    @staticmethod
+    def normalize_stage_name(stage_name: str):
+        """关卡名中的英文字母统一大写，如 ss-8 → SS-8"""
+        return ''.join(char.upper() if char.isalpha() and ord(char) < 128 else char for char in stage_name)
+
     async def get_stage_info(self, stage_name: str):
         """获取关卡信息和图片"""
-        try:
-            stage_name = ''.join(char.upper() if char.isalpha() and ord(char) < 128 else char for char in stage_name)
-            name_out, wikitext = await search_model.get_wikitext(stage_name)
-            if wikitext:
-                image_url = await self.get_stage_image(wikitext)
-                return StageInfo(
-                    image_url=image_url,
-                    stage_name=name_out,
-                    wikitext=wikitext
-                )
-        except (httpx.HTTPStatusError, httpx.RequestError) as e:
-            logger.error(f"获取关卡信息失败: {e}")
+        stage_info, enemies = await self.load_stage(stage_name)
+        return stage_info
+
+    def parse_enemy_html(self, html_data: str):
+        """用BeautifulSoup解析渲染后的敌人表格，wikitext中找不到敌人模板时使用"""
+        with stats.timer("stage_enemy.parse_html"):
+            return self._parse_enemy_html(html_data)
+
+    @staticmethod
+    def _parse_enemy_html(html_data: str):
+        # bs4导入较慢，且只有wikitext中没有敌人模板的关卡才需要，首次使用时再导入
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html_data, "html.parser")
+        enemy_data_list = []  # 临时存储敌人数据
+
+        # PRTS敌人信息基本都在<tr>里
+        for tr in soup.find_all("tr"):
+            # 查找敌人图标
+            icon_div = tr.find("div", class_="enemyicon") # 仅做判断是否为敌人行
+            if not icon_div:
+                continue  # 跳过非敌人行
+            # 敌人名称（在a标签title里）
+            name_a = tr.find("a", title=True)
+            enemy_name = name_a["title"] if name_a else None
+            if enemy_name:
+                # 剩下的td为属性值
+                tds = tr.find_all("td")
+                # 第一个td是名字旁边的div，跳过
+                stats = [td.get_text(strip=True) for td in tds[2:]]  # 从第3个td开始才是数值
+                # 临时存储敌人数据
+                enemy_data_list.append({
+                    "name": enemy_name,
+                    "stats": stats
+                })
+        return enemy_data_list
+
+    async def parse_stage_page(self, stage_name: str):
+        """
+        一次action=parse请求同时获取wikitext和渲染后的页面，返回(标题, 修订版本号, wikitext, html)，页面不存在时返回None
+        取回的wikitext同时写入缓存，之后加载该关卡时可直接从缓存提取敌人
+        """
+        params = {
+            "action": "parse",
+            "page": stage_name,
+            "format": "json",
+            "prop": "text|wikitext",
+            "redirects": 1
+        }
+        data = await search_model._api_get(params)
+        if "parse" not in data:
             return None
-
-    async def get_enemy_in_stage(self, stage_name: str):
-        """获取关卡下敌人的信息，不使用get_enemy_info，单开一个"""
-        try:
-            stage_name = ''.join(char.upper() if char.isalpha() and ord(char) < 128 else char for char in stage_name)
-            # 获取页面html
-            url = "https://prts.wiki/api.php"
-            params = {
-                "action": "parse",
-                "page": stage_name,
-                "format": "json",
-                "prop": "text",
-                "redirects": 1
-            }
-            resp = await search_model.http_client.get(url, params=params)
-            resp.raise_for_status()
-            html_data = resp.json()["parse"]["text"]["*"]
-            # 解析页面html
-            soup = BeautifulSoup(html_data, "html.parser")
-            enemies = []
-            enemy_names = []  # 收集所有敌人名称
-            enemy_data_list = []  # 临时存储敌人数据
-
-            # PRTS敌人信息基本都在<tr>里
-            for tr in soup.find_all("tr"):
-                # 查找敌人图标
-                icon_div = tr.find("div", class_="enemyicon") # 仅做判断是否为敌人行
-                if not icon_div:
-                    continue  # 跳过非敌人行
-                # 敌人名称（在a标签title里）
-                name_a = tr.find("a", title=True)
-                enemy_name = name_a["title"] if name_a else None
-                if enemy_name:
-                    enemy_names.append(enemy_name)
-                    # 剩下的td为属性值
-                    tds = tr.find_all("td")
-                    # 第一个td是名字旁边的div，跳过
-                    stats = [td.get_text(strip=True) for td in tds[2:]]  # 从第3个td开始才是数值
-                    # 临时存储敌人数据
-                    enemy_data_list.append({
-                        "name": enemy_name,
-                        "stats": stats
-                    })
-            enemy_images = {}
-            if self.enemy_image:
-            # 并发获取所有敌人头像URL
-                if enemy_names:
-                    image_names = [f"文件:头像 敌人 {name}.png" for name in enemy_names]
-                    image_urls = await search_model.get_images_url(image_names)
-                    for i, name in enumerate(enemy_names):
-                        if i < len(image_urls):
-                            enemy_images[name] = image_urls[i]
-            # 组合敌人信息，有头像
-                for enemy_data in enemy_data_list:
-                    enemy_name = enemy_data["name"]
-                    enemies.append({
-                        "name": enemy_name,
-                        "icon_url": enemy_images.get(enemy_name, None),
-                        "stats": enemy_data["stats"]
-                    })
-            else:
+        parse_data = data["parse"]
+        name_out, revid, wikitext = parse_data.get("title", stage_name), parse_data["revid"], parse_data["wikitext"]["*"]
+        search_model.wikitext_cache.put(stage_name, name_out, revid, wikitext)
+        return name_out, revid, wikitext, parse_data["text"]["*"]
+
+    async def attach_enemy_images(self, enemy_data_list: list):
+        """为敌人数据添加头像链接（按配置）"""
+        if not self.enemy_image:
             # 组合敌人信息，无头像
-                for enemy_data in enemy_data_list:
-                    enemy_name = enemy_data["name"]
-                    enemies.append({
-                        "name": enemy_name,
-                        "stats": enemy_data["stats"]
-                    })
-            return enemies
+            return [{"name": enemy_data["name"], "stats": enemy_data["stats"]} for enemy_data in enemy_data_list]
+        enemy_images = {}
+        enemy_names = list(dict.fromkeys(enemy_data["name"] for enemy_data in enemy_data_list))  # 收集所有敌人名称
+        # 并发获取所有敌人头像URL，按标题对应，缺失的图片不会错位
+        if enemy_names:
+            image_names = {name: f"文件:头像 敌人 {name}.png" for name in enemy_names}
+            image_urls = await search_model.resolve_image_urls(list(image_names.values()))
+            for name, image_name in image_names.items():
+                enemy_images[name] = image_urls.get(search_model.normalize_image_title(image_name))
+        # 组合敌人信息，有头像
+        return [{
+            "name": enemy_data["name"],
+            "icon_url": enemy_images.get(enemy_data["name"], None),
+            "stats": enemy_data["stats"]
+        } for enemy_data in enemy_data_list]
+
+    @stats.timed("stage_enemy.load_stage")
+    async def load_stage(self, stage_name: str):
+        """
+        加载关卡信息和关卡下的敌人，返回(StageInfo, 敌人列表)，未找到关卡时StageInfo为None
+        已缓存wikitext时直接从中提取敌人，wikitext中没有敌人模板时才请求渲染页面；
+        未缓存时只发一次action=parse请求，同时取回wikitext和渲染后的页面；
+        离线模式下只使用镜像中的wikitext，关卡地图和敌人头像并发获取
+        """
+        stage_name = self.normalize_stage_name(stage_name)
+        cached = self.stage_cache.get(stage_name)
+        stage_hit = cached is not None and time.time() - cached[0] <= self.STAGE_CACHE_TTL
+        stats.cache("stage", stage_hit)
+        if stage_hit:
+            return cached[1]
+        try:
+            enemy_data_list = None
+            if search_model.offline or search_model.cached_revision_id(stage_name) is not None:
+                name_out, wikitext = await search_model.get_wikitext(stage_name)
+                if not wikitext:
+                    return None, []
+                page = parse_page(wikitext, stage_name, search_model.cached_revision_id(stage_name))
+                with stats.timer("stage_enemy.extract_wikitext"):
+                    enemy_data_list = extract_stage_enemies(page)
+            # 离线模式下只有镜像中的wikitext，无法请求渲染后的页面，直接使用已提取到的敌人
+            if not enemy_data_list and not search_model.offline:
+                parsed = await self.parse_stage_page(stage_name)
+                if parsed is None:
+                    return None, []
+                name_out, revid, wikitext, html_data = parsed
+                page = parse_page(wikitext, stage_name, revid)
+                with stats.timer("stage_enemy.extract_wikitext"):
+                    enemy_data_list = extract_stage_enemies(page)
+                if not enemy_data_list:
+                    enemy_data_list = self.parse_enemy_html(html_data)
+            enemies, image_url = await asyncio.gather(
+                self.attach_enemy_images(enemy_data_list), self.get_stage_image(page))
+            stage_info = StageInfo(
+                image_url=image_url,
+                stage_name=name_out,
+                wikitext=wikitext
+            )
         except (httpx.HTTPStatusError, httpx.RequestError) as e:
             logger.error(f"获取关卡 {stage_name} 信息失败: {e}")
-            return []
+            return None, []
         except KeyError as e:
             logger.error(f"解析关卡 {stage_name} 数据时出错，缺少键值: {e}")
-            return []
+            return None, []
         except Exception as e:
             logger.error(f"获取关卡 {stage_name} 信息时发生未知错误: {e}")
-            return []
+            return None, []
+        self.stage_cache[stage_name] = (time.time(), (stage_info, enemies))
+        # 超出容量时淘汰最早加载的关卡
+        while len(self.stage_cache) > self.STAGE_CACHE_SIZE:
+            self.stage_cache.popitem(last=False)
+        return stage_info, enemies
+
+    async def get_enemy_in_stage(self, stage_name: str):
+        """获取关卡下敌人的信息，不使用get_enemy_info，单开一个"""
+        stage_info, enemies = await self.load_stage(stage_name)
+        return enemies
 
     async def all_enemy_and_stage_info_out(self, enemies, stageinfo):
         """输出关卡下所有敌人的信息"""
@@ -484,43 +659,29 @@ class StageEnemy:
             else:
                 print(f"该关卡未找到{enemy_name}敌人信息")
 
-    async def run(self, text1=None, text2=None):
-        """主函数，负责用户交互和数据处理"""
-        print("-" * 30)
-        print("敌人名称（如: 源石虫）或关卡名称（如: SS-8，3-3）")
-        print("或均输入，查询关卡下改名敌人数值（空格，中英文逗号分隔）")
-        print("-" * 30)
-        query_text = input("请输入要查询的敌人或关卡名称: ").strip()
-        # 只在需要时加载敌人数据
-        if not self.enemy_data:
-            await self.load_enemy_data()
-        enemy_name_data = self.enemy_data
-        # 根据输入的空格或中英文逗号切分并赋值
-        if query_text:
-            # 使用正则表达式按空格或中英文逗号分割输入
-            parts = re.split(r'[\s,，]+', query_text)
-            if len(parts) >= 1:
-                text1 = parts[0]
-            if len(parts) >= 2:
-                text2 = parts[1]
+    @stats.timed("stage_enemy.query")
+    async def query(self, query_text: str):
+        """
+        查询敌人或关卡，返回StageQueryResult；输入无效时返回None
+        输入一个名称时先按敌人匹配，不是敌人则按关卡查询；输入两个名称时查询关卡下的该敌人
+        """
+        # 只在需要时加载敌人数据，过期数据在后台刷新
+        await self.ensure_enemy_data()
+        enemy_name_data = self.enemy_names
+        # 使用正则表达式按空格或中英文逗号分割输入
+        parts = [part for part in re.split(r'[\s,，]+', query_text.strip()) if part]
+        text1 = parts[0] if len(parts) >= 1 else None
+        text2 = parts[1] if len(parts) >= 2 else None
         if text1 and text2 is None:
             # 单个参数查询
             text1 = await self.find_exact_enemy_name(text1)
             if text1 in enemy_name_data:
                 enemy_info = await self.get_enemy_info(text1)
-                if enemy_info:
-                    await self.enemy_info_out(enemy_info)
-                else:
-                    print(f"未找到敌人: {text1}")
-            else:
-                stage_info = await self.get_stage_info(text1)
-                if stage_info:
-                    # 获取关卡中的敌人信息
-                    enemies = await self.get_enemy_in_stage(text1)
-                    await self.all_enemy_and_stage_info_out(enemies, stage_info)
-                else:
-                    print(f"未找到关卡: {text1}")
-        elif text1 and text2:
+                return StageQueryResult(enemy_info, None, [], text1, None)
+            # 一次加载关卡信息和关卡中的敌人信息
+            stage_info, enemies = await self.load_stage(text1)
+            return StageQueryResult(None, stage_info, enemies, None, text1)
+        if text1 and text2:
             # 两个参数查询
             if text2 in enemy_name_data:
                 enemy_name = text2
@@ -528,15 +689,33 @@ class StageEnemy:
             else:
                 enemy_name = text1
                 stage_name = text2
-            stageinfo = await self.get_stage_info(stage_name)
-            if stageinfo:
-                enemies = await self.get_enemy_in_stage(stage_name)
-                await self.once_enemy_and_stage_info_out(enemies, enemy_name, stageinfo)
+            stage_info, enemies = await self.load_stage(stage_name)
+            return StageQueryResult(None, stage_info, enemies, enemy_name, stage_name)
+        return None
+
+    async def run(self, query_text=None):
+        """主函数，负责用户交互和数据处理"""
+        print("-" * 30)
+        print("敌人名称（如: 源石虫）或关卡名称（如: SS-8，3-3）")
+        print("或均输入，查询关卡下改名敌人数值（空格，中英文逗号分隔）")
+        print("-" * 30)
+        if query_text is None:
+            query_text = input("请输入要查询的敌人或关卡名称: ").strip()
+        result = await self.query(query_text)
+        if result is None:
+            print("请输入有效的查询参数")
+        elif result.stage_name is None:
+            if result.enemy_info:
+                await self.enemy_info_out(result.enemy_info)
             else:
-                print(f"未找到关卡 {stage_name} 的信息")
+                print(f"未找到敌人: {result.enemy_name}")
+        elif not result.stage_info:
+            print(f"未找到关卡: {result.stage_name}")
+        elif result.enemy_name is None:
+            await self.all_enemy_and_stage_info_out(result.enemies, result.stage_info)
         else:
-            print("请输入有效的查询参数")
-        return None
+            await self.once_enemy_and_stage_info_out(result.enemies, result.enemy_name, result.stage_info)
+        return result
 
 # 延迟初始化
 stage_enemy_instance = None
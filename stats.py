@@ -0,0 +1,128 @@
+import time, json, threading, functools
+from contextlib import contextmanager
+
+# 延迟直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class PhaseStats:
+    """单个阶段的统计：次数、字节数、总耗时、最大耗时、延迟直方图"""
+
+    __slots__ = ('count', 'bytes', 'total_seconds', 'max_seconds', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.bytes = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # 最后一个为+Inf
+
+    def record(self, seconds, nbytes=0):
+        self.count += 1
+        self.bytes += nbytes
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+
+class Stats:
+    """
+    各阶段的耗时统计和缓存命中率
+    用法：with stats.timer("阶段名"): ...  或装饰器 @stats.timed("阶段名")
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.caches = {}  # 缓存名→[命中次数, 未命中次数]
+        self._lock = threading.Lock()  # 部分解析在线程中执行
+
+    def record(self, phase: str, seconds: float, nbytes: int = 0):
+        with self._lock:
+            phase_stats = self.phases.get(phase)
+            if phase_stats is None:
+                phase_stats = self.phases[phase] = PhaseStats()
+            phase_stats.record(seconds, nbytes)
+
+    @contextmanager
+    def timer(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - start)
+
+    def timed(self, phase: str):
+        """异步函数的计时装饰器"""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.timer(phase):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def cache(self, name: str, hit: bool, count: int = 1):
+        """记录缓存命中或未命中"""
+        with self._lock:
+            counter = self.caches.setdefault(name, [0, 0])
+            counter[0 if hit else 1] += count
+
+    def reset(self):
+        with self._lock:
+            self.phases.clear()
+            self.caches.clear()
+
+    def to_dict(self):
+        with self._lock:
+            phases = {}
+            for phase, phase_stats in sorted(self.phases.items()):
+                cumulative = 0
+                buckets = {}
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), phase_stats.buckets):
+                    cumulative += count
+                    buckets[str(bound)] = cumulative
+                phases[phase] = {
+                    "count": phase_stats.count,
+                    "bytes": phase_stats.bytes,
+                    "total_ms": round(phase_stats.total_seconds * 1000, 3),
+                    "avg_ms": round(phase_stats.total_seconds * 1000 / phase_stats.count, 3),
+                    "max_ms": round(phase_stats.max_seconds * 1000, 3),
+                    "buckets": buckets
+                }
+            caches = {}
+            for name, (hits, misses) in sorted(self.caches.items()):
+                total = hits + misses
+                caches[name] = {"hits": hits, "misses": misses, "hit_ratio": round(hits / total, 4) if total else 0.0}
+        return {"phases": phases, "caches": caches}
+
+    def dump_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+    def dump_prometheus(self):
+        """导出为Prometheus文本格式"""
+        data = self.to_dict()
+        lines = [
+            "# HELP ark_phase_seconds 各阶段耗时",
+            "# TYPE ark_phase_seconds histogram",
+        ]
+        for phase, info in data["phases"].items():
+            for bound, count in info["buckets"].items():
+                lines.append(f'ark_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {count}')
+            lines.append(f'ark_phase_seconds_sum{{phase="{phase}"}} {info["total_ms"] / 1000}')
+            lines.append(f'ark_phase_seconds_count{{phase="{phase}"}} {info["count"]}')
+        lines += ["# HELP ark_phase_bytes_total 各阶段下载的字节数", "# TYPE ark_phase_bytes_total counter"]
+        for phase, info in data["phases"].items():
+            lines.append(f'ark_phase_bytes_total{{phase="{phase}"}} {info["bytes"]}')
+        lines += ["# HELP ark_cache_requests_total 缓存命中/未命中次数", "# TYPE ark_cache_requests_total counter"]
+        for name, info in data["caches"].items():
+            lines.append(f'ark_cache_requests_total{{cache="{name}",result="hit"}} {info["hits"]}')
+            lines.append(f'ark_cache_requests_total{{cache="{name}",result="miss"}} {info["misses"]}')
+        return "\n".join(lines) + "\n"
+
+
+# 创建全局实例
+stats = Stats()
@@ -0,0 +1,4 @@
+import os, sys
+
+# 项目为平铺的模块，测试时从项目目录导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,21 @@
+import json
+import pytest
+from enemy_query import EnemyTable, parse_query
+
+"""敌人条件查询：数据中没有某项数值时应报告，而不是返回0个结果"""
+
+
+def grade_only_table():
+    raw = {"name": "敌人", "enemyLevel": "BOSS", "endure": "E", "attack": "E", "defence": "E", "resistance": "E"}
+    return EnemyTable([{"name": "敌人", "race": "", "level": "BOSS", "attack_type": "", "damage_type": "",
+                        "motion": "", "raw": json.dumps(raw, ensure_ascii=False)}])
+
+
+@pytest.mark.parametrize("query", ["防御力>1000", "排序=-生命值", "统计=攻击力"])
+def test_grade_only_numbers_are_reported(query):
+    with pytest.raises(ValueError, match="没有"):
+        grade_only_table().execute(parse_query(query))
+
+
+def test_text_columns_still_work_without_numbers():
+    assert grade_only_table().execute(parse_query("地位=领袖")).total == 1
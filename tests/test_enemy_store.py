@@ -0,0 +1,38 @@
+import json
+from bench.synthetic import SyntheticPRTS
+from enemy_store import EnemyStore
+from stage_enemy import StageEnemy
+from wikitext_parser import parse_wikitext
+
+"""敌人信息：本地数据库命中时与请求敌人页面时应得到相同的EnemyInfo"""
+
+
+def test_store_hit_matches_page(tmp_path):
+    prts = SyntheticPRTS()
+    records = [json.loads(line) for line in prts.pages["敌人一览/数据"].splitlines()]
+    store = EnemyStore(str(tmp_path / "enemy.db"))
+    store.replace_all(records)
+    hits = 0
+    for name in prts.enemy_names:
+        record = store.get(name)
+        hits += StageEnemy.record_complete(record)
+        from_store = StageEnemy.enemy_info_from_record(record, "image")
+        from_page = StageEnemy.parse_enemy_page(name, parse_wikitext(prts.pages[name]), "image")
+        assert from_store == from_page, name
+        assert from_store.level in ("普通", "精英", "领袖")
+        assert from_store.endure == str(record_value(records, name, "maxHp"))
+    assert hits
+
+
+def record_value(records, name, key):
+    return next(record[key] for record in records if record["name"] == name)
+
+
+def test_grade_only_record_is_not_a_hit(tmp_path):
+    """只有评级、没有具体数值的记录不能代替敌人页面"""
+    store = EnemyStore(str(tmp_path / "enemy.db"))
+    store.replace_all([{"name": "敌人", "enemyRace": "感染生物", "enemyLevel": "NORMAL", "attackType": "近战",
+                        "damageType": "物理", "endure": "E", "attack": "E", "defence": "E", "resistance": "E"}])
+    record = store.get("敌人")
+    assert record["endure"] == "E"
+    assert not StageEnemy.record_complete(record)
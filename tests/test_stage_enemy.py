@@ -0,0 +1,48 @@
+import os
+import pytest
+from bench.synthetic import SyntheticPRTS
+from bench.fixtures import load_fixtures
+from stage_enemy import StageEnemy, extract_stage_enemies
+from wikitext_parser import parse_wikitext
+
+"""
+关卡敌人：wikitext中的敌人模板与渲染后的敌人表格（parse_stage_html）应得到相同的名称和12项数值
+合成数据中的wikitext和表格都由bench/synthetic.py按自拟的「关卡敌人」格式生成，只能检查两种解析彼此一致，
+不能说明PRTS真实页面的格式；真实格式由录制的fixtures检查
+"""
+
+FIXTURES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'bench', 'fixtures', 'prts.json')
+
+
+def test_wikitext_matches_html_synthetic():
+    """自拟格式下两种解析的结果一致（循环验证，不检查真实页面格式）"""
+    parse_data = SyntheticPRTS()._parse({"page": "SS-8"})["parse"]
+    from_wikitext = extract_stage_enemies(parse_wikitext(parse_data["wikitext"]["*"]))
+    from_html = StageEnemy._parse_enemy_html(parse_data["text"]["*"])
+    assert len(from_wikitext) == 40
+    assert from_wikitext == from_html
+
+
+def test_wikitext_matches_html_recorded():
+    """用从PRTS录制的action=parse响应（python -m bench --record）比较两种解析结果"""
+    if not os.path.exists(FIXTURES_FILE):
+        pytest.skip("没有录制的fixtures（python -m bench --record）")
+    pages = [fixture["json"]["parse"] for key, fixture in load_fixtures(FIXTURES_FILE).items()
+             if "action=parse" in key and "parse" in fixture["json"]]
+    compared = 0
+    for parse_data in pages:
+        from_wikitext = extract_stage_enemies(parse_wikitext(parse_data["wikitext"]["*"]))
+        if not from_wikitext:
+            continue
+        assert from_wikitext == StageEnemy._parse_enemy_html(parse_data["text"]["*"]), parse_data["title"]
+        compared += 1
+    if not compared:
+        pytest.skip("录制的关卡页面wikitext中没有敌人模板")
+
+
+def test_other_templates_are_not_enemy_rows():
+    """含名称和数值参数、但不是敌人行模板的模板不产生敌人"""
+    page = parse_wikitext("{{干员信息\n|名称=娜仁图亚\n|生命值=1000\n|攻击力=500\n}}\n"
+                          "{{关卡敌人\n|名称=[[敌人001]]\n|数量=2\n|生命值=3000\n}}")
+    assert [enemy["name"] for enemy in extract_stage_enemies(page)] == ["敌人001"]
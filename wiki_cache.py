@@ -0,0 +1,143 @@
+import os, json, time, hashlib, logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class WikitextCache:
+    """
+    wikitext缓存：内存LRU + 磁盘缓存
+    以页面标题为键，记录修订版本号(revid)，版本号未变化时无需重新下载全文
+    磁盘缓存超过max_disk_entries个文件时，按修改时间淘汰最久未使用的文件
+    """
+
+    # 每写入这么多次检查一次磁盘缓存的文件数
+    PRUNE_EVERY = 64
+
+    def __init__(self, cache_dir, max_entries=256, max_disk_entries=4096):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        # OrderedDict按访问顺序排列，末尾为最近使用
+        self._memory = OrderedDict()
+        # 重定向：最终标题→以其他标题（请求的重定向标题）缓存的标题集合，最终页面变化时一并删除
+        self._aliases = {}
+        self._writes = 0
+
+    def _path(self, title: str):
+        # 标题可能含有/等字符，使用md5作为文件名
+        digest = hashlib.md5(title.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _remember(self, title: str, entry: dict):
+        self._forget(title)
+        self._memory[title] = entry
+        if entry["name_out"] != title:
+            self._aliases.setdefault(entry["name_out"], set()).add(title)
+        # 超出容量时淘汰最久未使用的项
+        while len(self._memory) > self.max_entries:
+            self._forget(next(iter(self._memory)))
+
+    def _forget(self, title: str):
+        """从内存中删除缓存项及其重定向记录"""
+        entry = self._memory.pop(title, None)
+        if entry is not None and entry["name_out"] != title:
+            aliases = self._aliases.get(entry["name_out"])
+            if aliases is not None:
+                aliases.discard(title)
+                if not aliases:
+                    del self._aliases[entry["name_out"]]
+
+    def get(self, title: str):
+        """获取缓存项，内存未命中时尝试从磁盘加载"""
+        entry = self._memory.get(title)
+        if entry is not None:
+            self._memory.move_to_end(title)
+            return entry
+        try:
+            with open(self._path(title), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"读取wikitext缓存失败: {e}")
+            return None
+        # 防止md5碰撞或旧文件导致标题不一致
+        if entry.get("title") != title:
+            return None
+        # 更新修改时间，淘汰磁盘缓存时视为最近使用
+        try:
+            os.utime(self._path(title))
+        except OSError:
+            pass
+        self._remember(title, entry)
+        return entry
+
+    def put(self, title: str, name_out: str, revid: int, wikitext: str):
+        """写入缓存（内存和磁盘）"""
+        entry = {
+            "title": title,
+            "name_out": name_out,
+            "revid": revid,
+            "wikitext": wikitext,
+            "checked_time": time.time()
+        }
+        self._remember(title, entry)
+        self._write(entry)
+        return entry
+
+    def touch(self, title: str):
+        """版本号校验通过后刷新校验时间"""
+        entry = self.get(title)
+        if entry is not None:
+            entry["checked_time"] = time.time()
+            self._write(entry)
+
+    def invalidate(self, title: str):
+        """删除缓存项，以及内存中以重定向标题缓存的同一页面"""
+        for cached_title in [title, *self._aliases.get(title, ())]:
+            self._forget(cached_title)
+            try:
+                os.remove(self._path(cached_title))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"删除wikitext缓存失败: {e}")
+
+    def prune(self):
+        """磁盘缓存文件数超过max_disk_entries时，删除修改时间最早的文件，返回删除的数量"""
+        try:
+            files = [(item.stat().st_mtime, item.path) for item in os.scandir(self.cache_dir)
+                     if item.name.endswith('.json')]
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.error(f"读取wikitext缓存目录失败: {e}")
+            return 0
+        excess = len(files) - self.max_disk_entries
+        if excess <= 0:
+            return 0
+        files.sort()
+        for mtime, path in files[:excess]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        logger.info(f"已淘汰 {excess} 个wikitext磁盘缓存")
+        return excess
+
+    def _write(self, entry: dict):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # 先写临时文件再替换，避免写入中断产生损坏的缓存
+            path = self._path(entry["title"])
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"写入wikitext缓存失败: {e}")
+            return
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
@@ -0,0 +1,213 @@
+import time, asyncio, logging, httpx
+from search_model import search_model, MAX_TITLES_PER_REQUEST
+from stats import stats
+import recent_changes
+
+logger = logging.getLogger(__name__)
+
+"""
+PRTS页面的本地镜像：同步时按分类（或全部页面）枚举，只下载修订版本号变化的页面
+页面正文压缩后存入SQLite，search_model的离线模式直接从镜像读取，无需联网
+之后的同步通过recentchanges（见recent_changes.py）只获取有变化的页面
+    python . --sync       # 同步镜像（首次或--full时完整同步）
+    python . --offline    # 只使用镜像查询
+"""
+
+# 枚举页面时每次请求返回的数量，max为API允许的最大值（普通用户为500）
+ENUMERATE_LIMIT = "max"
+
+
+class WikiMirror:
+    """同步PRTS页面到本地镜像，设置见config.yaml的mirror项"""
+
+    def __init__(self, config=None):
+        self.config = config
+        mirror_config = (config or {}).get("mirror", {})
+        self.categories = mirror_config.get("categories", [])
+        self.pages = mirror_config.get("pages", [])
+        self.all_pages = mirror_config.get("all_pages", False)
+        self.sync_redirects = mirror_config.get("redirects", True)
+        self.sync_images = mirror_config.get("images", False)
+        self.concurrency = mirror_config.get("concurrency", 4)
+        self.store = search_model.open_mirror(mirror_config)
+
+    async def _enumerate(self, params: dict):
+        """执行列表/生成器查询并跟随续传，逐批返回query数据"""
+        while True:
+            data = await search_model._api_get(params)
+            yield data.get("query", {})
+            if "continue" not in data:
+                break
+            params = {**params, **data["continue"]}
+
+    async def _generator_revisions(self, params: dict):
+        """用生成器枚举页面，同时取得各页面当前的修订版本号（prop=info的lastrevid）"""
+        revids = {}
+        async for query_data in self._enumerate({**params, "prop": "info", "format": "json"}):
+            for page_data in query_data.get("pages", {}).values():
+                if "lastrevid" in page_data:
+                    revids[page_data["title"]] = page_data["lastrevid"]
+        return revids
+
+    async def enumerate_pages(self):
+        """返回需要镜像的页面 标题→当前修订版本号"""
+        revids = {}
+        if self.all_pages:
+            revids.update(await self._generator_revisions({
+                "action": "query", "generator": "allpages", "gapnamespace": "0",
+                "gapfilterredir": "nonredirects", "gaplimit": ENUMERATE_LIMIT}))
+        else:
+            for category in self.categories:
+                revids.update(await self._generator_revisions({
+                    "action": "query", "generator": "categorymembers", "gcmtitle": f"Category:{category}",
+                    "gcmnamespace": "0", "gcmlimit": ENUMERATE_LIMIT}))
+        if self.pages:
+            # 单独指定的页面（如「敌人一览/数据」）不一定属于上述分类
+            for title in self.pages:
+                revids.pop(title, None)
+            page_revids = await search_model.get_revision_ids(self.pages)
+            if page_revids is None:
+                raise httpx.RequestError("获取页面版本号失败")
+            revids.update(page_revids)
+        return revids
+
+    async def enumerate_redirects(self, targets):
+        """返回指向已镜像页面的重定向 重定向标题→目标标题"""
+        redirects = {}
+        async for query_data in self._enumerate({
+                "action": "query", "generator": "allpages", "gapnamespace": "0",
+                "gapfilterredir": "redirects", "gaplimit": ENUMERATE_LIMIT, "redirects": "1", "format": "json"}):
+            for item in query_data.get("redirects", []):
+                if item["to"] in targets:
+                    redirects[item["from"]] = item["to"]
+        return redirects
+
+    async def enumerate_images(self):
+        """返回全部图片的 文件名→url"""
+        images = {}
+        async for query_data in self._enumerate({
+                "action": "query", "list": "allimages", "aiprop": "url", "ailimit": ENUMERATE_LIMIT,
+                "format": "json"}):
+            for item in query_data.get("allimages", []):
+                images[search_model.image_file_name(item["title"])] = item["url"]
+        return images
+
+    async def filter_mirrored(self, titles: list):
+        """从新出现的页面中选出需要镜像的页面（属于镜像的分类，或为单独指定的页面）"""
+        if self.all_pages:
+            return list(titles)
+        selected = [title for title in titles if title in self.pages]
+        candidates = [title for title in titles if title not in self.pages]
+        if not candidates or not self.categories:
+            return selected
+        for i in range(0, len(candidates), MAX_TITLES_PER_REQUEST):
+            params = {
+                "action": "query",
+                "prop": "categories",
+                "titles": "|".join(candidates[i:i + MAX_TITLES_PER_REQUEST]),
+                "clcategories": "|".join(f"Category:{category}" for category in self.categories),
+                "cllimit": "max",
+                "format": "json"
+            }
+            # 只返回属于指定分类的categories，没有该字段的页面不属于任何镜像分类
+            async for query_data in self._enumerate(params):
+                selected.extend(page_data["title"] for page_data in query_data.get("pages", {}).values()
+                                if page_data.get("categories") and page_data["title"] not in selected)
+        return selected
+
+    async def download(self, titles: list):
+        """每50个标题一次请求下载正文，最多同时进行concurrency个请求，每批下载完成后立即写入镜像"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        done = 0
+
+        async def download_chunk(chunk):
+            nonlocal done
+            async with semaphore:
+                resolved, pages_by_title = await search_model._query_revisions(chunk)
+            pages = []
+            for title in chunk:
+                page_data = pages_by_title.get(resolved.get(title, title), {})
+                if page_data.get("revisions"):
+                    revision = page_data["revisions"][0]
+                    pages.append((page_data["title"], revision["revid"], revision["*"]))
+            self.store.put_pages(pages)
+            done += len(chunk)
+            logger.info(f"已下载 {done}/{len(titles)} 个页面")
+            return len(pages)
+
+        chunks = [titles[i:i + MAX_TITLES_PER_REQUEST] for i in range(0, len(titles), MAX_TITLES_PER_REQUEST)]
+        return sum(await asyncio.gather(*(download_chunk(chunk) for chunk in chunks)))
+
+    async def apply_changes(self, changes):
+        """按增量同步得到的页面变化（recent_changes.ChangeSet）更新镜像，返回下载和删除的数量"""
+        removed = [title for title in changes.removed if title not in changes.changed]
+        if removed:
+            self.store.delete_pages(removed)
+        stored = self.store.revision_ids()
+        titles = [title for title, revid in changes.changed.items()
+                  if title in stored and (revid is None or stored[title] != revid)]
+        titles += await self.filter_mirrored([title for title in changes.changed if title not in stored])
+        downloaded = await self.download(titles) if titles else 0
+        if downloaded or removed:
+            search_model.reset_mirror_index()
+        return {"downloaded": downloaded, "removed": len(removed)}
+
+    def last_sync_time(self):
+        """上次同步的开始时间（镜像中的数据不早于该时间），从未同步过时返回None"""
+        value = self.store.get_meta("last_sync")
+        return float(value) if value is not None else None
+
+    @stats.timed("wiki_mirror.sync")
+    async def sync(self, prune=True, full=False):
+        """
+        同步镜像：已同步过时只处理recentchanges中的页面变化；
+        首次同步、full为True或无法增量同步时，枚举页面及其当前版本号，只下载新增或版本号变化的页面，
+        prune为True时删除已不在枚举结果中的页面（已删除或移出分类）
+        返回各项数量的统计
+        """
+        tracker = recent_changes.initialize_recent_changes(self.config)
+        if not full and self.store.count() and tracker.has_baseline():
+            changes = await tracker.poll()
+            if changes is not None:
+                result = await tracker.apply(changes)
+                # 没有页面变化时apply不会更新镜像，结果中没有下载和删除的数量
+                result.setdefault("downloaded", 0)
+                result.setdefault("removed", 0)
+                result["pages"] = self.store.count()
+                self.store.set_meta("last_sync", time.time())
+                logger.info(f"镜像增量同步完成: {result}")
+                return result
+        # 先记录起点，完整同步期间发生的变化留给下次增量同步
+        await tracker.reset_baseline()
+        start_time = time.time()
+        revids = await self.enumerate_pages()
+        stored = self.store.revision_ids()
+        changed = [title for title, revid in revids.items() if stored.get(title) != revid]
+        logger.info(f"共 {len(revids)} 个页面，其中 {len(changed)} 个需要下载")
+        downloaded = await self.download(changed)
+        removed = [title for title in stored if title not in revids] if prune else []
+        if removed:
+            self.store.delete_pages(removed)
+        result = {"pages": len(revids), "downloaded": downloaded, "removed": len(removed)}
+        if self.sync_redirects:
+            redirects = await self.enumerate_redirects(set(revids))
+            self.store.replace_redirects(redirects)
+            result["redirects"] = len(redirects)
+        if self.sync_images:
+            images = await self.enumerate_images()
+            self.store.replace_images(images)
+            result["images"] = len(images)
+        self.store.set_meta("last_sync", start_time)
+        search_model.reset_mirror_index()
+        logger.info(f"镜像同步完成: {result}")
+        return result
+
+
+# 延迟初始化
+wiki_mirror_instance = None
+
+def initialize_wiki_mirror(config):
+    global wiki_mirror_instance
+    if wiki_mirror_instance is None:
+        wiki_mirror_instance = WikiMirror(config)
+    return wiki_mirror_instance
@@ -0,0 +1,159 @@
+import re
+from collections import OrderedDict
+from stats import stats
+
+"""
+wikitext模板解析：单次遍历整页，得到嵌套的 模板→参数 结构，各模块通过字典查找读取字段
+解析结果按(页面标题, 修订版本号)缓存，同一版本的页面只解析一次
+"""
+
+# 预编译wikitext清理正则表达式
+COLOR_PATTERN = re.compile(r'\{\{color\|#[0-9A-F]{6}\|(.*?)}}')
+LINK_PATTERN_1 = re.compile(r'\[\[([^]|]+)\|([^]]+)]]')
+LINK_PATTERN_2 = re.compile(r'\[\[([^]]+)]]')
+BOLD_ITALIC_PATTERN = re.compile(r"''+(.*?)''+")
+# 模板解析关注的标记
+TOKEN_PATTERN = re.compile(r'\{\{|}}|\[\[|]]|\|')
+
+# 解析结果缓存，(标题, 修订版本号)→PageTemplates
+PAGE_CACHE_SIZE = 128
+_page_cache = OrderedDict()
+
+
+class Template:
+    """
+    一个模板：name为模板名，params为参数字典（无名参数以1、2、3……为键），
+    templates为参数值中嵌套的模板（按出现顺序）
+    """
+
+    __slots__ = ('name', 'params', 'templates')
+
+    def __init__(self, name, params, templates):
+        self.name = name
+        self.params = params
+        self.templates = templates
+
+    def get(self, key, default=None):
+        return self.params.get(key, default)
+
+    def __repr__(self):
+        return f"Template({self.name!r}, {self.params!r})"
+
+
+class PageTemplates:
+    """一个页面的全部模板：templates为顶层模板，all为含嵌套模板在内的全部模板（按出现顺序）"""
+
+    __slots__ = ('templates', 'all')
+
+    def __init__(self, templates, all_templates):
+        self.templates = templates
+        self.all = all_templates
+
+    def find(self, name):
+        """返回指定名称的全部模板"""
+        return [template for template in self.all if template.name == name]
+
+    def first(self, name):
+        """返回第一个指定名称的模板，没有时返回None"""
+        return next((template for template in self.all if template.name == name), None)
+
+    def param(self, key, default=None):
+        """返回页面中第一个含有该参数的模板的参数值"""
+        for template in self.all:
+            if key in template.params:
+                return template.params[key]
+        return default
+
+
+def _split_params(parts):
+    params = {}
+    position = 0
+    for part in parts:
+        key, sep, value = part.partition('=')
+        # 含有嵌套模板或链接的等号不作为参数名分隔
+        if sep and '{{' not in key and '[[' not in key:
+            params[key.strip()] = value.strip()
+        else:
+            position += 1
+            params[str(position)] = part.strip()
+    return params
+
+
+def parse_wikitext(wikitext):
+    """
+    单次遍历wikitext，返回PageTemplates
+    参数值中的[[链接|文字]]和嵌套模板里的|不会被当作分隔符
+    """
+    top_level = []
+    all_templates = []  # (起始位置, 模板)
+    stack = []  # 每层为 [模板起始位置, 当前参数起始位置, 参数列表, 链接深度, 嵌套模板列表]
+    # 用正则跳到下一个标记，标记之间的普通文本不逐字符处理
+    for match in TOKEN_PATTERN.finditer(wikitext):
+        token = match.group()
+        i = match.start()
+        if token == '{{':
+            stack.append([i, i + 2, [], 0, []])
+        elif not stack:
+            continue
+        elif token == '}}':
+            start, part_start, parts, _, children = stack.pop()
+            parts.append(wikitext[part_start:i])
+            template = Template(parts[0].strip(), _split_params(parts[1:]), children)
+            all_templates.append((start, template))
+            (stack[-1][4] if stack else top_level).append(template)
+        elif token == '[[':
+            stack[-1][3] += 1
+        elif token == ']]':
+            stack[-1][3] = max(0, stack[-1][3] - 1)
+        elif stack[-1][3] == 0:
+            frame = stack[-1]
+            frame[2].append(wikitext[frame[1]:i])
+            frame[1] = i + 1
+    # 嵌套模板先于外层模板结束，按起始位置恢复文档顺序
+    all_templates.sort(key=lambda item: item[0])
+    return PageTemplates(top_level, [template for _, template in all_templates])
+
+
+def parse_page(wikitext, title=None, revid=None):
+    """解析页面，标题和修订版本号都已知时使用缓存，同一版本只解析一次"""
+    if title is None or revid is None:
+        return parse_wikitext(wikitext)
+    key = (title, revid)
+    page = _page_cache.get(key)
+    stats.cache("templates", page is not None)
+    if page is not None:
+        _page_cache.move_to_end(key)
+        return page
+    with stats.timer("wikitext_parser.parse"):
+        page = parse_wikitext(wikitext)
+    _page_cache[key] = page
+    # 超出容量时淘汰最久未使用的页面
+    while len(_page_cache) > PAGE_CACHE_SIZE:
+        _page_cache.popitem(last=False)
+    return page
+
+
+def clear_cache():
+    _page_cache.clear()
+
+
+def invalidate(titles):
+    """删除指定页面的解析结果（页面有新版本后旧版本的结果不会再用到）"""
+    for key in [key for key in _page_cache if key[0] in titles]:
+        del _page_cache[key]
+
+
+def clean_wikitext(text):
+    """清理wikitext中的标记，提取纯文本内容（同步版本）"""
+    if not text:
+        return ""  # 返回空字符串而不是None
+
+    # 移除颜色标记 {{color|#00B0FF|回旋投射物}}
+    text = COLOR_PATTERN.sub(r'\1', text)
+
+    # 移除其他常见的wikitext标记
+    text = LINK_PATTERN_1.sub(r'\2', text)  # [[链接|显示文字]] -> 显示文字
+    text = LINK_PATTERN_2.sub(r'\1', text)  # [[链接]] -> 链接
+    text = BOLD_ITALIC_PATTERN.sub(r'\1', text)  # 移除粗体和斜体标记
+    text = text.replace('*', '')
+    return text.strip()